@@ -1,40 +1,264 @@
-from fastapi import FastAPI, Depends, HTTPException
+from datetime import date, datetime
+from typing import Optional
+import json
+import time
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from .setups import crud, models, schemas  # Use absolute imports
-from .setups.database import engine, get_db
+from .setups import crud, export, models, rollups, schemas, search  # Use absolute imports
+from .setups.database import engine, async_engine, get_session, run_db
+from .setups.cache import create_response_cache, etag_for, etag_matches
+from .setups.metrics import REGISTRY, histogram
+
+# Upper bound on the records accepted by one bulk request
+MAX_BULK_RECORDS = int(os.getenv("MAX_BULK_RECORDS", 100_000))
 
 # Create the FastAPI app
 app = FastAPI()
 
-# Create all the tables in the database (this is equivalent to running migrations)
+# Read-through cache for the detection read endpoints
+response_cache = create_response_cache()
+
+# Labelled by route template rather than raw path, so ids and cursors do not create new series
+REQUEST_SECONDS = histogram('http_request_duration_seconds', 'API request latency until the response starts',
+                            ['method', 'route', 'status'])
+
+# Create all the tables in the database (this is equivalent to running migrations). Indexes
+# missing on tables that already exist are left to `python -m app.setups.models`, which builds
+# them concurrently, so startup never blocks writers behind an index build.
 models.Base.metadata.create_all(bind=engine)
+models.add_missing_columns(engine)
+rollups.install_rollups(engine)
+
+# Release pooled connections cleanly when the server stops
+@app.on_event("shutdown")
+async def dispose_engines():
+    engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
 
-# API endpoint to get all detection records
+# Record the latency of every request
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                route=getattr(route, "path", "unmatched"), status=status)
+
+# Serve a JSON response through the read cache, answering If-None-Match with 304.
+# `produce` returns (payload, extra headers) and only runs on a cache miss.
+async def cached_json_response(request: Request, produce):
+    if not response_cache.enabled:
+        payload, headers = await produce()
+        body = json.dumps(jsonable_encoder(payload)).encode()
+        entry = {"body": body.decode(), "etag": etag_for(body), "headers": headers}
+    else:
+        key = await response_cache.key(request.url.path, request.query_params.multi_items())
+        entry = await response_cache.get(key)
+        if entry is None:
+            payload, headers = await produce()
+            body = json.dumps(jsonable_encoder(payload)).encode()
+            entry = {"body": body.decode(), "etag": etag_for(body), "headers": headers}
+            await response_cache.set(key, entry)
+    headers = {"ETag": entry["etag"], **entry["headers"]}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+# API endpoint to get detection records, newest first.
+# Pass the X-Next-Cursor response header back as `cursor` to fetch the next page;
+# `skip` still works but gets slower the deeper the page.
 @app.get("/detections/", response_model=list[schemas.ObjectDetection])
-def read_detections(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    detections = crud.get_detections(db, skip=skip, limit=limit)
-    return detections
+async def read_detections(request: Request, skip: int = 0, limit: int = Query(10, ge=1, le=1000),
+                          cursor: Optional[str] = None, class_name: Optional[str] = None,
+                          image_name: Optional[str] = None, channel: Optional[str] = None,
+                          min_confidence: Optional[float] = None, max_confidence: Optional[float] = None,
+                          since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          db: Session = Depends(get_session)):
+    async def produce():
+        try:
+            detections = await run_db(db, crud.get_detections, skip=skip, limit=limit, cursor=cursor,
+                                      class_name=class_name, image_name=image_name, channel=channel,
+                                      min_confidence=min_confidence, max_confidence=max_confidence,
+                                      since=since, until=until)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {}
+        if len(detections) == limit:
+            headers["X-Next-Cursor"] = crud.encode_cursor(detections[-1])
+        return [schemas.ObjectDetection.from_orm(detection) for detection in detections], headers
+
+    return await cached_json_response(request, produce)
 
 # API endpoint to get a single detection by ID
 @app.get("/detections/{detection_id}", response_model=schemas.ObjectDetection)
-def read_detection(detection_id: int, db: Session = Depends(get_db)):
-    detection = crud.get_detection_by_id(db, detection_id=detection_id)
-    if detection is None:
-        raise HTTPException(status_code=404, detail="Detection not found")
-    return detection
+async def read_detection(request: Request, detection_id: int, db: Session = Depends(get_session)):
+    async def produce():
+        detection = await run_db(db, crud.get_detection_by_id, detection_id=detection_id)
+        if detection is None:
+            raise HTTPException(status_code=404, detail="Detection not found")
+        return schemas.ObjectDetection.from_orm(detection), {}
+
+    return await cached_json_response(request, produce)
+
+# API endpoint to search messages in fct_messages (PostgreSQL, built by dbt).
+# `fulltext` ranks matches of a web-style query ("quoted phrases", or, -exclude);
+# `substring` finds the text anywhere in a message, newest first, through the trigram index.
+# Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+@app.get("/messages/search", response_model=list[schemas.MessageSearchResult])
+async def search_messages(response: Response, q: str = Query(..., min_length=1, max_length=200),
+                          mode: str = Query("fulltext", regex="^(fulltext|substring)$"),
+                          channel: Optional[str] = None, since: Optional[date] = None,
+                          until: Optional[date] = None, limit: int = Query(20, ge=1, le=200),
+                          cursor: Optional[str] = None, db: Session = Depends(get_session)):
+    try:
+        results = await run_db(db, search.search_messages, q=q, mode=mode, channel=channel,
+                               since=since, until=until, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(results) == limit:
+        response.headers["X-Next-Cursor"] = search.encode_cursor(results[-1])
+    return results
+
+# Stream every row of an export query in the requested format. The rows come from a
+# server-side cursor on a connection of the export's own (not the request's session),
+# so the response is never held in memory.
+def streaming_export(query, export_format: str, dataset: str):
+    try:
+        encoder = export.create_encoder(export_format, query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if async_engine is not None:
+        body = export.aiter_export(async_engine, query, encoder, dataset)
+    else:
+        body = export.iter_export(engine, query, encoder, dataset)
+    headers = {"Content-Disposition": f'attachment; filename="{dataset}.{encoder.extension}"'}
+    return StreamingResponse(body, media_type=encoder.media_type, headers=headers)
+
+# API endpoint to export detections, oldest first, as NDJSON, CSV or an Arrow IPC stream
+@app.get("/export/detections")
+async def export_detections(format: str = Query("ndjson", regex="^(ndjson|csv|arrow)$"),
+                            class_name: Optional[str] = None, channel: Optional[str] = None,
+                            since: Optional[datetime] = None, until: Optional[datetime] = None):
+    query = export.detections_query(class_name=class_name, channel=channel, since=since, until=until)
+    return streaming_export(query, format, "detections")
+
+# API endpoint to export messages from fct_messages (PostgreSQL, built by dbt), oldest first
+@app.get("/export/messages")
+async def export_messages(format: str = Query("ndjson", regex="^(ndjson|csv|arrow)$"),
+                          channel: Optional[str] = None, since: Optional[datetime] = None,
+                          until: Optional[datetime] = None):
+    if engine.dialect.name != "postgresql":
+        raise HTTPException(status_code=404, detail="Messages are only available from the PostgreSQL warehouse")
+    query = export.messages_query(channel=channel, since=since, until=until)
+    return streaming_export(query, format, "messages")
+
+# Prometheus scrape endpoint for this process's metrics
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(content=REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# API endpoint to get read-cache hit/miss counters
+@app.get("/cache/stats")
+async def read_cache_stats():
+    return response_cache.stats()
 
 # API endpoint to create a new detection record
 @app.post("/detections/", response_model=schemas.ObjectDetection)
-def create_detection(detection: schemas.ObjectDetectionCreate, db: Session = Depends(get_db)):
-    return crud.create_detection(db=db, detection=detection)
+async def create_detection(detection: schemas.ObjectDetectionCreate, db: Session = Depends(get_session)):
+    created = await run_db(db, crud.create_detection, detection=detection)
+    await response_cache.invalidate()
+    return created
+
+# Validate one bulk record, reporting its position on failure
+def parse_bulk_record(parse, item, position):
+    try:
+        return parse(item)
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Record {position}: {e}")
+
+# Parse a bulk request body: a JSON array, or NDJSON (one object per line) read as it streams in
+async def parse_bulk_detections(request: Request):
+    too_many = HTTPException(status_code=413, detail=f"At most {MAX_BULK_RECORDS} records per request")
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        detections = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    detections.append(parse_bulk_record(schemas.ObjectDetectionCreate.parse_raw, line, len(detections)))
+            if len(detections) > MAX_BULK_RECORDS:
+                raise too_many
+        if buffer.strip():
+            detections.append(parse_bulk_record(schemas.ObjectDetectionCreate.parse_raw, buffer, len(detections)))
+        return detections
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Expected a JSON array of detections")
+    if len(payload) > MAX_BULK_RECORDS:
+        raise too_many
+    return [parse_bulk_record(schemas.ObjectDetectionCreate.parse_obj, item, i) for i, item in enumerate(payload)]
+
+# API endpoint to create many detection records in one transaction
+@app.post("/detections/bulk", response_model=schemas.BulkInsertResult)
+async def create_detections_bulk(request: Request, return_ids: bool = False, db: Session = Depends(get_session)):
+    detections = await parse_bulk_detections(request)
+    inserted, ids = await run_db(db, crud.bulk_create_detections, detections=detections, return_ids=return_ids)
+    await response_cache.invalidate()
+    return schemas.BulkInsertResult(inserted=inserted, ids=ids)
 
 # API endpoint to delete a detection record
 @app.delete("/detections/{detection_id}", response_model=schemas.ObjectDetection)
-def delete_detection(detection_id: int, db: Session = Depends(get_db)):
-    detection = crud.delete_detection(db=db, detection_id=detection_id)
+async def delete_detection(detection_id: int, db: Session = Depends(get_session)):
+    detection = await run_db(db, crud.delete_detection, detection_id=detection_id)
     if detection is None:
         raise HTTPException(status_code=404, detail="Detection not found")
+    await response_cache.invalidate()
     return detection
+
+# Analytics endpoints, served from rollup tables that triggers on object_detections keep
+# current, instead of scanning object_detections; reads never write
+
+# API endpoint to get detections per day and class
+@app.get("/analytics/detections/daily", response_model=list[schemas.DailyDetectionCount])
+async def read_daily_detection_counts(class_name: Optional[str] = None, channel: Optional[str] = None,
+                                      since: Optional[date] = None, until: Optional[date] = None,
+                                      db: Session = Depends(get_session)):
+    return await run_db(db, rollups.get_daily_counts, class_name=class_name, channel=channel,
+                        since=since, until=until)
+
+# API endpoint to get detections per channel
+@app.get("/analytics/detections/channels", response_model=list[schemas.ChannelDetectionCount])
+async def read_channel_detection_counts(class_name: Optional[str] = None, since: Optional[date] = None,
+                                        until: Optional[date] = None, db: Session = Depends(get_session)):
+    return await run_db(db, rollups.get_channel_counts, class_name=class_name, since=since, until=until)
+
+# API endpoint to get the confidence histogram
+@app.get("/analytics/detections/confidence-histogram", response_model=list[schemas.ConfidenceBucket])
+async def read_confidence_histogram(class_name: Optional[str] = None, since: Optional[date] = None,
+                                    until: Optional[date] = None, db: Session = Depends(get_session)):
+    return await run_db(db, rollups.get_confidence_histogram, class_name=class_name, since=since, until=until)
+
+# API endpoint to recompute the rollups from object_detections
+@app.post("/analytics/refresh", response_model=schemas.RollupRefreshResult)
+async def refresh_analytics(db: Session = Depends(get_session)):
+    folded = await run_db(db, rollups.rebuild_rollups)
+    return schemas.RollupRefreshResult(folded=folded)
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Cache configuration
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()  # "memory", "redis" or "none"
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 30))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Redis key holding the generation shared by every API process and the batch writers
+GENERATION_KEY = "detections:cache:generation"
+
+# In-process LRU cache whose entries also expire after a TTL
+class LRUCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    async def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def get_generation(self):
+        return self.generation
+
+    async def bump_generation(self):
+        with self.lock:
+            self.generation += 1
+            # Old generations can never be read again; free their memory right away
+            self.entries.clear()
+
+# Redis-backed cache shared between API workers
+class RedisCache:
+    def __init__(self, url=CACHE_REDIS_URL, ttl=CACHE_TTL_SECONDS):
+        import redis.asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key):
+        value = await self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value):
+        await self.client.set(key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    async def get_generation(self):
+        return int(await self.client.get(GENERATION_KEY) or 0)
+
+    async def bump_generation(self):
+        # Entries of older generations are simply never read again and expire by TTL
+        await self.client.incr(GENERATION_KEY)
+
+# Read-through response cache with generation-based invalidation and hit/miss counters
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    async def key(self, path, params):
+        """Builds a key from the path and the sorted query parameters, scoped to the current generation."""
+        generation = await self.backend.get_generation()
+        raw = json.dumps([path, sorted(params)], default=str)
+        return f"detections:cache:{generation}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    async def get(self, key):
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value):
+        await self.backend.set(key, value)
+
+    async def invalidate(self):
+        if self.enabled:
+            self.invalidations += 1
+            await self.backend.bump_generation()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": CACHE_BACKEND if self.enabled else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+# Build the cache configured by the environment
+def create_response_cache():
+    if CACHE_BACKEND == "redis":
+        return ResponseCache(RedisCache())
+    if CACHE_BACKEND == "memory":
+        return ResponseCache(LRUCache())
+    return ResponseCache(None)
+
+# Compute a strong ETag for a response body
+def etag_for(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+# Check an If-None-Match header against an ETag: "*" or a comma-separated list of tags,
+# compared weakly as the header requires, so W/"x" matches "x"
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+    return opaque(etag) in {opaque(tag) for tag in if_none_match.split(",")}
+
+# Synchronous Redis client of invalidate_shared_cache, created on first use and reused
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def _redis_client():
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            import redis
+
+            _shared_client = redis.Redis.from_url(CACHE_REDIS_URL)
+        return _shared_client
+
+# Invalidate the API cache from another process (e.g. the detection writer).
+# Only the Redis backend is shared; in-process caches rely on their TTL instead.
+def invalidate_shared_cache():
+    if CACHE_BACKEND != "redis":
+        return
+    _redis_client().incr(GENERATION_KEY)
@@ -1,9 +1,60 @@
+import base64
+from datetime import datetime
+from sqlalchemy import insert, tuple_
 from sqlalchemy.orm import Session
 from . import models, schemas
+from .pgcopy import csv_buffer
 
-# Get all detection records
-def get_detections(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.ObjectDetection).offset(skip).limit(limit).all()
+# Encode the (detection_time, id) position of a row as an opaque page cursor
+def encode_cursor(detection: models.ObjectDetection):
+    raw = f"{detection.detection_time.isoformat()}|{detection.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+# Decode a page cursor back into (detection_time, id); raises ValueError when malformed
+def decode_cursor(cursor: str):
+    try:
+        detection_time, detection_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(detection_time), int(detection_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# Condition matching the images of one channel. Images are named {channel}_{message id}.jpg
+# by the scraper, so the channel is everything before the last underscore: the name must start
+# with "{channel}_" and have no further underscore, or channel "a" would also match "a_b_1.jpg".
+# Both are LIKE patterns, so the text_pattern_ops index on image_name still serves the prefix.
+def channel_condition(column, channel: str):
+    prefix = channel.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(f"{prefix}\\_%", escape="\\") & ~column.like(f"{prefix}\\_%\\_%", escape="\\")
+
+# Get detection records, newest first, filtered and paginated by cursor (or offset).
+# Rows without a detection_time have no place in the (detection_time, id) keyset and are left out.
+def get_detections(db: Session, skip: int = 0, limit: int = 10, cursor: str = None,
+                   class_name: str = None, image_name: str = None, channel: str = None,
+                   min_confidence: float = None, max_confidence: float = None,
+                   since: datetime = None, until: datetime = None):
+    Detection = models.ObjectDetection
+    query = db.query(Detection).filter(Detection.detection_time.isnot(None))
+    if class_name is not None:
+        query = query.filter(Detection.class_name == class_name)
+    if image_name is not None:
+        query = query.filter(Detection.image_name == image_name)
+    if channel is not None:
+        query = query.filter(channel_condition(Detection.image_name, channel))
+    if min_confidence is not None:
+        query = query.filter(Detection.confidence >= min_confidence)
+    if max_confidence is not None:
+        query = query.filter(Detection.confidence <= max_confidence)
+    if since is not None:
+        query = query.filter(Detection.detection_time >= since)
+    if until is not None:
+        query = query.filter(Detection.detection_time < until)
+    if cursor is not None:
+        # Keyset pagination: seek past the last row of the previous page instead of counting rows
+        query = query.filter(tuple_(Detection.detection_time, Detection.id) < decode_cursor(cursor))
+    query = query.order_by(Detection.detection_time.desc(), Detection.id.desc())
+    if skip and cursor is None:
+        query = query.offset(skip)
+    return query.limit(limit).all()
 
 # Get a single detection by ID
 def get_detection_by_id(db: Session, detection_id: int):
@@ -17,9 +68,40 @@ def create_detection(db: Session, detection: schemas.ObjectDetectionCreate):
     db.refresh(db_detection)
     return db_detection
 
+# Columns written by the bulk insert, in COPY order
+BULK_COLUMNS = ["image_name", "class_name", "confidence", "x_min", "y_min", "x_max", "y_max", "detection_time",
+                "model_name"]
+
+# COPY rows through the raw psycopg2 connection of the session's transaction
+def _copy_detections(db: Session, rows):
+    buffer = csv_buffer([row[column] for column in BULK_COLUMNS] for row in rows)
+    raw = db.connection().connection.dbapi_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY object_detections ({', '.join(BULK_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+# Create many detection records in a single transaction; returns (count, ids or None)
+def bulk_create_detections(db: Session, detections: list[schemas.ObjectDetectionCreate], return_ids: bool = False):
+    rows = [detection.dict() for detection in detections]
+    if not rows:
+        return 0, [] if return_ids else None
+    table = models.ObjectDetection.__table__
+    bind = db.get_bind()
+    ids = None
+    if return_ids:
+        # insertmanyvalues batches this into multi-row INSERT ... RETURNING statements
+        ids = list(db.execute(insert(table).returning(table.c.id), rows).scalars())
+    elif bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+        _copy_detections(db, rows)
+    else:
+        db.execute(insert(table), rows)
+    db.commit()
+    return len(rows), ids
+
 # Delete a detection record
 def delete_detection(db: Session, detection_id: int):
     db_detection = db.query(models.ObjectDetection).filter(models.ObjectDetection.id == detection_id).first()
+    if db_detection is None:
+        return None
     db.delete(db_detection)
     db.commit()
     return db_detection
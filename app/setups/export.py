@@ -0,0 +1,172 @@
+import io
+import os
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.sql import sqltypes
+from starlette.concurrency import run_in_threadpool
+from . import models
+from .crud import channel_condition
+from .search import fct_messages
+from .metrics import counter
+
+# Rows fetched from the server-side cursor, and encoded into one response chunk, at a time
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 10_000))
+
+EXPORT_ROWS = counter('export_rows_total', 'Rows streamed by the export endpoints', ['dataset', 'format'])
+
+# Exports stream straight from a server-side cursor on a connection of their own: rows
+# arrive EXPORT_CHUNK_ROWS at a time as plain tuples, each chunk is encoded and sent
+# before the next is fetched, so server memory stays flat however large the extract.
+# Once streaming has started the status is already sent; a database error mid-stream
+# cuts the response short (a truncated CSV or NDJSON body, or an Arrow stream without
+# its end-of-stream marker).
+
+# Function to select detections for export, oldest first, filtered by class, channel and time range
+def detections_query(class_name: str = None, channel: str = None, since: datetime = None, until: datetime = None):
+    table = models.ObjectDetection.__table__
+    query = select(table.c.id, table.c.image_name, table.c.class_name, table.c.confidence, table.c.x_min,
+                   table.c.y_min, table.c.x_max, table.c.y_max, table.c.detection_time,
+                   table.c.model_name)
+    if class_name is not None:
+        query = query.where(table.c.class_name == class_name)
+    if channel is not None:
+        query = query.where(channel_condition(table.c.image_name, channel))
+    if since is not None:
+        query = query.where(table.c.detection_time >= since)
+    if until is not None:
+        query = query.where(table.c.detection_time < until)
+    return query.order_by(table.c.detection_time, table.c.id)
+
+# Function to select messages from fct_messages for export, oldest first, filtered by channel and time range
+def messages_query(channel: str = None, since: datetime = None, until: datetime = None):
+    t = fct_messages
+    query = select(t.c.message_id, t.c.channel, t.c.sender_id, t.c.message_text, t.c.message_at, t.c.message_date)
+    if channel is not None:
+        query = query.where(t.c.channel == channel)
+    if since is not None:
+        query = query.where(t.c.message_at >= since)
+    if until is not None:
+        query = query.where(t.c.message_at < until)
+    return query.order_by(t.c.message_at, t.c.message_id)
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+class NdjsonEncoder:
+    """One JSON object per line."""
+
+    format = "ndjson"
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, columns):
+        self.columns = [column.name for column in columns]
+
+    def header(self):
+        return b""
+
+    def encode(self, rows):
+        return "".join(json.dumps(dict(zip(self.columns, row)), default=_json_default) + "\n"
+                       for row in rows).encode()
+
+    def footer(self):
+        return b""
+
+class CsvEncoder:
+    """A header line, then one CSV record per row."""
+
+    format = "csv"
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, columns):
+        self.columns = [column.name for column in columns]
+
+    def _write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self):
+        return self._write([self.columns])
+
+    def encode(self, rows):
+        return self._write(rows)
+
+    def footer(self):
+        return b""
+
+class ArrowEncoder:
+    """The Arrow IPC streaming format: the schema, one record batch per chunk, end-of-stream.
+
+    Readable with pyarrow.ipc.open_stream, or pandas/polars on top of it.
+    """
+
+    format = "arrow"
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self, columns):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = pa.schema([(column.name, self._arrow_type(column.type)) for column in columns])
+
+    def _arrow_type(self, column_type):
+        pa = self.pa
+        if isinstance(column_type, sqltypes.Integer):
+            return pa.int64()
+        if isinstance(column_type, (sqltypes.Float, sqltypes.Numeric)):
+            return pa.float64()
+        if isinstance(column_type, sqltypes.DateTime):
+            return pa.timestamp("us")
+        if isinstance(column_type, sqltypes.Date):
+            return pa.date32()
+        return pa.string()
+
+    def header(self):
+        return self.schema.serialize().to_pybytes()
+
+    def encode(self, rows):
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        return self.pa.RecordBatch.from_arrays(arrays, schema=self.schema).serialize().to_pybytes()
+
+    def footer(self):
+        # End-of-stream marker: continuation token and a zero message length
+        return b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+# Export formats, by the name passed as ?format=
+EXPORT_FORMATS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder, "arrow": ArrowEncoder}
+
+# Function to build the encoder of a format for the columns of a query; raises ValueError on unknown formats
+def create_encoder(export_format: str, query):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return EXPORT_FORMATS[export_format](list(query.selected_columns))
+
+# Stream the encoded rows of `query` from a server-side cursor on a new connection of `engine`
+def iter_export(engine, query, encoder, dataset, chunk_rows=EXPORT_CHUNK_ROWS):
+    yield encoder.header()
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+        for rows in result.partitions():
+            EXPORT_ROWS.inc(len(rows), dataset=dataset, format=encoder.format)
+            yield encoder.encode(rows)
+    yield encoder.footer()
+
+# The same on an async engine, through AsyncConnection.stream; chunks are encoded off the event loop
+async def aiter_export(async_engine, query, encoder, dataset, chunk_rows=EXPORT_CHUNK_ROWS):
+    yield encoder.header()
+    async with async_engine.connect() as connection:
+        result = await connection.stream(query.execution_options(yield_per=chunk_rows))
+        async for rows in result.partitions():
+            EXPORT_ROWS.inc(len(rows), dataset=dataset, format=encoder.format)
+            yield await run_in_threadpool(encoder.encode, rows)
+    yield encoder.footer()
@@ -0,0 +1,201 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# Default latency buckets in seconds, from 1ms to 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Byte-size buckets, from 1 KiB to 64 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+# Metrics are process-local and cheap to update from any thread: each update takes
+# one lock and touches one dict entry. The API exposes them in the Prometheus text
+# format at /metrics; batch scripts log summary() when they finish.
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    """A monotonically increasing value per label combination; by convention the name ends in _total."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield self.name + _format_labels(self.labelnames, key), value
+
+    def summary(self):
+        with self.lock:
+            return {', '.join(key) or 'total': value for key, value in sorted(self.values.items())}
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count, per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, count=1, **labels):
+        """Records `count` observations of `value` (e.g. a batch's per-item latency for every item)."""
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += count
+            series[1] += value * count
+            series[2] += count
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            series = {key: (list(buckets), total, count) for key, (buckets, total, count) in self.series.items()}
+        for key, (buckets, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), buckets):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + '_bucket' + _format_labels(self.labelnames, key, [('le', le)]), cumulative
+            yield self.name + '_sum' + _format_labels(self.labelnames, key), total
+            yield self.name + '_count' + _format_labels(self.labelnames, key), count
+
+    def _quantile(self, buckets, count, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets, buckets):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+    def summary(self):
+        with self.lock:
+            series = {key: (list(buckets), total, count) for key, (buckets, total, count) in self.series.items()}
+        return {
+            ', '.join(key) or 'total': {
+                'count': count,
+                'mean': total / count if count else 0.0,
+                'p50': self._quantile(buckets, count, 0.5),
+                'p99': self._quantile(buckets, count, 0.99),
+            }
+            for key, (buckets, total, count) in sorted(series.items())
+        }
+
+class Registry:
+    """Holds the metrics of a process; metrics with the same name are shared."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **options):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **options)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(f"{sample} {value}" for sample, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        summaries = {name: metric.summary() for name, metric in sorted(self.metrics.items())}
+        return {name: summary for name, summary in summaries.items() if summary}
+
+    def log_summary(self, logger, level=logging.INFO):
+        """Logs one line per metric, for batch scripts to call when they finish."""
+        for name, series in self.summary().items():
+            if isinstance(next(iter(series.values())), dict):
+                parts = (f"{key}: n={s['count']} mean={s['mean']:.4g} p50={s['p50']:.4g} p99={s['p99']:.4g}"
+                         for key, s in series.items())
+            else:
+                parts = (f"{key}={value}" for key, value in series.items())
+            logger.log(level, f"{name}: " + '; '.join(parts))
+
+# The process-wide registry
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+# Shared by every writer to PostgreSQL, labelled with the writer's name
+DB_FLUSH_SECONDS = histogram('db_flush_seconds', 'Time to commit one batch to PostgreSQL', ['writer'])
+DB_ROWS_WRITTEN = counter('db_rows_written_total', 'Rows committed to PostgreSQL', ['writer'])
+
+class LogSampler:
+    """Logs every `every`-th call at DEBUG, for per-item messages that would flood the log at volume."""
+
+    def __init__(self, logger, every=100):
+        self.logger = logger
+        self.every = max(1, every)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def debug(self, message, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        with self.lock:
+            self.calls += 1
+            sampled = self.calls % self.every == 1 or self.every == 1
+        if sampled:
+            self.logger.debug(message, *args)
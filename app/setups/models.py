@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, Index, inspect, text
+from sqlalchemy.schema import CreateIndex
 from .database import Base
 
 # SQLAlchemy model for the object_detections table
@@ -14,3 +15,74 @@ class ObjectDetection(Base):
     x_max = Column(Float)
     y_max = Column(Float)
     detection_time = Column(DateTime)
+    # Model (weights and settings) that produced the detection; NULL for rows posted to the API without one
+    model_name = Column(String)
+
+    # Indexes backing the keyset pagination order (detection_time, id) and its filters
+    __table_args__ = (
+        Index("ix_object_detections_time_id", "detection_time", "id"),
+        Index("ix_object_detections_class_time_id", "class_name", "detection_time", "id"),
+        Index("ix_object_detections_class_confidence", "class_name", "confidence"),
+        # text_pattern_ops lets Postgres use the index for channel prefix (LIKE 'name\_%') lookups too
+        Index("ix_object_detections_image_name", "image_name",
+              postgresql_ops={"image_name": "text_pattern_ops"}),
+    )
+
+# Rollup of detections per day, class and channel, refreshed incrementally from object_detections
+class DetectionDailyRollup(Base):
+    __tablename__ = "detection_daily_rollup"
+
+    day = Column(Date, primary_key=True)
+    class_name = Column(String, primary_key=True)
+    channel = Column(String, primary_key=True)
+    detections = Column(BigInteger, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index("ix_detection_daily_rollup_channel_day", "channel", "day"),
+    )
+
+# Rollup of detection counts per day, class and confidence bucket
+class DetectionConfidenceHistogram(Base):
+    __tablename__ = "detection_confidence_histogram"
+
+    day = Column(Date, primary_key=True)
+    class_name = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    detections = Column(BigInteger, nullable=False, default=0)
+
+# Function to add indexes that create_all skips on tables which already exist. On Postgres they
+# are built with CREATE INDEX CONCURRENTLY, outside a transaction, so writers are not blocked
+# while a large table is indexed; an interrupted build leaves an INVALID index to drop before
+# running this again. Run it as an admin step (python -m app.setups.models), not at startup.
+def create_indexes(bind):
+    if bind.dialect.name != "postgresql":
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=bind, checkfirst=True)
+        return
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+                connection.execute(text(ddl.replace("INDEX ", "INDEX CONCURRENTLY ", 1)))
+
+# Function to add columns that create_all skips on tables which already exist
+def add_missing_columns(bind):
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                with bind.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                            f"{column.type.compile(dialect=bind.dialect)}"))
+
+if __name__ == "__main__":
+    from .database import engine
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    create_indexes(engine)
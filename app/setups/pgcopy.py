@@ -0,0 +1,16 @@
+import io
+
+# Postgres reads an unquoted empty CSV field as NULL and a quoted one as an empty string, but
+# csv.writer writes None and '' alike, so empty strings came back as NULL. Here every value is
+# quoted and None is the only field left unquoted and empty.
+
+# Function to encode rows (sequences of values) for COPY ... FROM STDIN WITH (FORMAT csv);
+# returns a buffer ready to pass to copy_expert
+def csv_buffer(rows):
+    buffer = io.StringIO()
+    for values in rows:
+        buffer.write(",".join("" if value is None else '"' + str(value).replace('"', '""') + '"'
+                              for value in values))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
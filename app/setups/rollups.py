@@ -0,0 +1,193 @@
+from datetime import date
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from . import models
+
+# Confidence histogram resolution: HISTOGRAM_BUCKETS equal-width buckets over [0, 1]
+HISTOGRAM_BUCKETS = 20
+
+# SQL expressions shared by the triggers and the rebuild (PostgreSQL).
+# Images are named {channel}_{message id}.jpg by the scraper, so the channel is
+# everything before the last underscore.
+def _day(alias):
+    return f"({alias}.detection_time)::date"
+
+def _class(alias):
+    return f"coalesce({alias}.class_name, 'unknown')"
+
+def _channel(alias):
+    return f"coalesce(regexp_replace({alias}.image_name, '_[^_]*$', ''), 'unknown')"
+
+def _bucket(alias):
+    return f"least(greatest(floor({alias}.confidence * {HISTOGRAM_BUCKETS})::int, 0), {HISTOGRAM_BUCKETS - 1})"
+
+# Statements adding `sign` times the rows of `source` to the rollups. Rows are grouped and
+# upserted in key order, so concurrent writers lock rollup rows in the same order.
+def _fold_statements(source, sign):
+    return [
+        f"""
+        INSERT INTO detection_daily_rollup AS r (day, class_name, channel, detections, confidence_sum)
+        SELECT {_day('d')}, {_class('d')}, {_channel('d')}, {sign} * count(*), {sign} * coalesce(sum(d.confidence), 0)
+          FROM {source} d
+         WHERE d.detection_time IS NOT NULL
+         GROUP BY 1, 2, 3
+         ORDER BY 1, 2, 3
+        ON CONFLICT (day, class_name, channel) DO UPDATE
+           SET detections = r.detections + excluded.detections,
+               confidence_sum = r.confidence_sum + excluded.confidence_sum
+        """,
+        f"""
+        INSERT INTO detection_confidence_histogram AS h (day, class_name, bucket, detections)
+        SELECT {_day('d')}, {_class('d')}, {_bucket('d')}, {sign} * count(*)
+          FROM {source} d
+         WHERE d.detection_time IS NOT NULL AND d.confidence IS NOT NULL
+         GROUP BY 1, 2, 3
+         ORDER BY 1, 2, 3
+        ON CONFLICT (day, class_name, bucket) DO UPDATE
+           SET detections = h.detections + excluded.detections
+        """,
+    ]
+
+# Source of the trigger functions, as pg_proc.prosrc stores it
+def _trigger_body(source, sign):
+    body = ";\n".join(_fold_statements(source, sign))
+    return f"""
+    BEGIN
+        {body};
+        RETURN NULL;
+    END;
+    """
+
+TRIGGER_FUNCTIONS = {
+    "fold_inserted_detections": _trigger_body("inserted_detections", 1),
+    "fold_deleted_detections": _trigger_body("deleted_detections", -1),
+}
+TRIGGERS = ("object_detections_fold_inserts", "object_detections_fold_deletes")
+
+# Any constant shared by the API workers; serializes their installs
+INSTALL_LOCK_KEY = 0x726f6c6c
+
+def _trigger_function(name):
+    return f"CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $${TRIGGER_FUNCTIONS[name]}$$ LANGUAGE plpgsql"
+
+# The rollups are maintained by statement-level triggers inside the transactions that
+# insert or delete detections: each COPY, bulk insert or single POST folds its own rows
+# (through its transition table) and commits them together with the rows, so no row can
+# be missed or counted twice however writers interleave.
+install_statements = [
+    # Replaced by the triggers below: the id high-water mark refresh and its per-row delete trigger
+    "DROP TRIGGER IF EXISTS object_detections_retract_rollups ON object_detections",
+    "DROP FUNCTION IF EXISTS retract_detection_rollups()",
+    "DROP TABLE IF EXISTS rollup_state",
+    _trigger_function("fold_inserted_detections"),
+    _trigger_function("fold_deleted_detections"),
+    "DROP TRIGGER IF EXISTS object_detections_fold_inserts ON object_detections",
+    """
+    CREATE TRIGGER object_detections_fold_inserts
+    AFTER INSERT ON object_detections
+    REFERENCING NEW TABLE AS inserted_detections
+    FOR EACH STATEMENT EXECUTE FUNCTION fold_inserted_detections()
+    """,
+    "DROP TRIGGER IF EXISTS object_detections_fold_deletes ON object_detections",
+    """
+    CREATE TRIGGER object_detections_fold_deletes
+    AFTER DELETE ON object_detections
+    REFERENCING OLD TABLE AS deleted_detections
+    FOR EACH STATEMENT EXECUTE FUNCTION fold_deleted_detections()
+    """,
+]
+
+# Whether the triggers and their current functions are installed and the old refresh is gone.
+# Only reads the catalogs, so the check takes no lock on object_detections.
+def _installed(connection):
+    if connection.execute(text("SELECT to_regclass('rollup_state') IS NOT NULL")).scalar():
+        return False
+    triggers = set(connection.execute(text(
+        "SELECT tgname FROM pg_trigger WHERE tgrelid = 'object_detections'::regclass AND NOT tgisinternal"
+    )).scalars())
+    sources = dict(connection.execute(text(
+        "SELECT proname, prosrc FROM pg_proc WHERE proname = ANY(:names)"
+    ), {"names": list(TRIGGER_FUNCTIONS)}).all())
+    return triggers.issuperset(TRIGGERS) and sources == TRIGGER_FUNCTIONS
+
+# Install the rollup triggers (PostgreSQL only); safe to run on every startup. When they are
+# already current this only reads the catalogs: the DDL, whose DROP TRIGGER locks
+# object_detections exclusively, runs only when something is missing or outdated, and
+# under an advisory lock, so workers starting together install it once.
+def install_rollups(bind):
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as connection:
+        if _installed(connection):
+            return
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": INSTALL_LOCK_KEY})
+        if _installed(connection):
+            # Another worker installed it while this one waited
+            return
+        upgrading = connection.execute(text("SELECT to_regclass('rollup_state') IS NOT NULL")).scalar()
+        for statement in install_statements:
+            connection.execute(text(statement))
+    if upgrading:
+        # Rollups kept by the old high-water mark refresh can miss late-committed rows
+        with Session(bind=bind) as db:
+            rebuild_rollups(db)
+
+# Recompute the rollups from object_detections, e.g. after changing the rollup definitions or
+# loading rows with the triggers disabled; returns the detections folded in. Writers wait
+# for the rebuild (SHARE lock), so none of their rows is folded twice or dropped.
+def rebuild_rollups(db: Session):
+    if db.get_bind().dialect.name != "postgresql":
+        return 0
+    db.execute(text("LOCK TABLE object_detections IN SHARE MODE"))
+    db.execute(text("TRUNCATE detection_daily_rollup, detection_confidence_histogram"))
+    for statement in _fold_statements("object_detections", 1):
+        db.execute(text(statement))
+    folded = db.execute(text("SELECT count(*) FROM object_detections")).scalar()
+    db.commit()
+    return folded
+
+def _filter_rollup(query, model, class_name=None, channel=None, since: date = None, until: date = None):
+    if class_name is not None:
+        query = query.filter(model.class_name == class_name)
+    if channel is not None:
+        query = query.filter(model.channel == channel)
+    if since is not None:
+        query = query.filter(model.day >= since)
+    if until is not None:
+        query = query.filter(model.day < until)
+    return query
+
+# Detections per day and class
+def get_daily_counts(db: Session, class_name: str = None, channel: str = None,
+                     since: date = None, until: date = None):
+    Rollup = models.DetectionDailyRollup
+    detections = func.sum(Rollup.detections)
+    query = db.query(Rollup.day, Rollup.class_name, detections.label("detections"),
+                     (func.sum(Rollup.confidence_sum) / func.nullif(detections, 0)).label("avg_confidence"))
+    query = _filter_rollup(query, Rollup, class_name, channel, since, until)
+    return query.group_by(Rollup.day, Rollup.class_name).having(detections > 0) \
+        .order_by(Rollup.day, Rollup.class_name).all()
+
+# Detections per channel
+def get_channel_counts(db: Session, class_name: str = None, since: date = None, until: date = None):
+    Rollup = models.DetectionDailyRollup
+    detections = func.sum(Rollup.detections)
+    query = db.query(Rollup.channel, detections.label("detections"),
+                     (func.sum(Rollup.confidence_sum) / func.nullif(detections, 0)).label("avg_confidence"))
+    query = _filter_rollup(query, Rollup, class_name, None, since, until)
+    return query.group_by(Rollup.channel).having(detections > 0).order_by(detections.desc()).all()
+
+# Detections per confidence bucket
+def get_confidence_histogram(db: Session, class_name: str = None, since: date = None, until: date = None):
+    Histogram = models.DetectionConfidenceHistogram
+    detections = func.sum(Histogram.detections)
+    query = db.query(Histogram.bucket, detections.label("detections"))
+    query = _filter_rollup(query, Histogram, class_name, None, since, until)
+    return [
+        {
+            "bucket_start": bucket / HISTOGRAM_BUCKETS,
+            "bucket_end": (bucket + 1) / HISTOGRAM_BUCKETS,
+            "detections": count,
+        }
+        for bucket, count in query.group_by(Histogram.bucket).order_by(Histogram.bucket).all()
+    ]
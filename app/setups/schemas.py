@@ -1,5 +1,6 @@
+from typing import Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 
 # Schema for reading detection data
 class ObjectDetectionBase(BaseModel):
@@ -11,6 +12,7 @@ class ObjectDetectionBase(BaseModel):
     x_max: float
     y_max: float
     detection_time: datetime
+    model_name: Optional[str] = None
 
 # Schema for creating detection data
 class ObjectDetectionCreate(ObjectDetectionBase):
@@ -22,3 +24,49 @@ class ObjectDetection(ObjectDetectionBase):
 
     class Config:
         orm_mode = True  # Enable ORM mode to interact with SQLAlchemy models
+
+# Schema for the result of a bulk insert
+class BulkInsertResult(BaseModel):
+    inserted: int
+    ids: Optional[list[int]] = None
+
+# Schema for detections per day and class
+class DailyDetectionCount(BaseModel):
+    day: date
+    class_name: str
+    detections: int
+    avg_confidence: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+# Schema for detections per channel
+class ChannelDetectionCount(BaseModel):
+    channel: str
+    detections: int
+    avg_confidence: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+# Schema for one bucket of the confidence histogram
+class ConfidenceBucket(BaseModel):
+    bucket_start: float
+    bucket_end: float
+    detections: int
+
+# Schema for the result of a rollup refresh
+class RollupRefreshResult(BaseModel):
+    folded: int
+
+# Schema for one message search result; rank is only set by full-text search
+class MessageSearchResult(BaseModel):
+    message_id: str
+    channel: Optional[str] = None
+    sender_id: Optional[str] = None
+    message_text: Optional[str] = None
+    message_at: Optional[datetime] = None
+    rank: Optional[float] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,94 @@
+import os
+import json
+import base64
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import Column, Date, DateTime, MetaData, Numeric, Table, Text, cast, func, select, tuple_
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Session
+
+# Text search configuration used to build fct_messages.search_vector (dbt var `search_config`).
+# 'simple' does no stemming, which suits the mix of Amharic and English in the channels.
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "simple")
+
+# Search modes: ranked full-text search, or a trigram-indexed substring match (the indexed
+# replacement for ILIKE '%term%'), newest first
+SEARCH_MODES = ("fulltext", "substring")
+
+# Trigram indexes only help with patterns of at least three characters
+MIN_SUBSTRING_LENGTH = 3
+
+# The message fact table built by dbt (medical_data_warehouse/models/marts/fct_messages.sql).
+# It has its own MetaData so that Base.metadata.create_all never tries to create it.
+def messages_table(name="fct_messages"):
+    return Table(
+        name, MetaData(),
+        Column("message_id", Text, primary_key=True),
+        Column("channel", Text),
+        Column("sender_id", Text),
+        Column("message_text", Text),
+        Column("message_text_normalized", Text),
+        Column("message_at", DateTime),
+        Column("message_date", Date),
+        Column("search_vector", TSVECTOR),
+    )
+
+fct_messages = messages_table()
+
+# Encode the (rank, message_at, message_id) position of a result as an opaque page cursor
+def encode_cursor(row):
+    rank = row["rank"]
+    raw = json.dumps([None if rank is None else str(rank), row["message_at"].isoformat(), row["message_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+# Decode a page cursor back into (rank, message_at, message_id); raises ValueError when malformed
+def decode_cursor(cursor: str):
+    try:
+        rank, message_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (None if rank is None else Decimal(rank)), datetime.fromisoformat(message_at), str(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# Search messages; returns a list of dicts with message_id, channel, sender_id, message_text,
+# message_at and rank (None in substring mode); messages without a message_at are left out.
+# Raises ValueError on bad input. PostgreSQL only.
+def search_messages(db: Session, q: str, mode: str = "fulltext", channel: str = None,
+                    since: date = None, until: date = None, limit: int = 20, cursor: str = None,
+                    table: Table = fct_messages):
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    t = table
+    position = decode_cursor(cursor) if cursor is not None else None
+
+    if mode == "fulltext":
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        # Rounded to a numeric so the cursor round-trips exactly; ts_rank_cd returns a float4
+        rank = func.round(cast(func.ts_rank_cd(t.c.search_vector, tsquery), Numeric), 6)
+        query = select(t.c.message_id, t.c.channel, t.c.sender_id, t.c.message_text, t.c.message_at,
+                       rank.label("rank")).where(t.c.search_vector.op("@@")(tsquery))
+        order = (rank.desc(), t.c.message_at.desc(), t.c.message_id.desc())
+        if position is not None:
+            query = query.where(tuple_(rank, t.c.message_at, t.c.message_id) < position)
+    else:
+        term = q.strip().lower()
+        if len(term) < MIN_SUBSTRING_LENGTH:
+            raise ValueError(f"Substring search needs at least {MIN_SUBSTRING_LENGTH} characters")
+        pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = select(t.c.message_id, t.c.channel, t.c.sender_id, t.c.message_text, t.c.message_at,
+                       cast(None, Numeric).label("rank")) \
+            .where(t.c.message_text_normalized.like(f"%{pattern}%", escape="\\"))
+        order = (t.c.message_at.desc(), t.c.message_id.desc())
+        if position is not None:
+            query = query.where(tuple_(t.c.message_at, t.c.message_id) < position[1:])
+
+    # Messages without a timestamp have no place in the keyset order, and the cursor could not encode them
+    query = query.where(t.c.message_at.isnot(None))
+    if channel is not None:
+        query = query.where(t.c.channel == channel)
+    if since is not None:
+        query = query.where(t.c.message_date >= since)
+    if until is not None:
+        query = query.where(t.c.message_date < until)
+    return [dict(row) for row in db.execute(query.order_by(*order).limit(limit)).mappings()]
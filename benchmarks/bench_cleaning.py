@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+import emoji
+import numpy as np
+import pandas as pd
+from scripts.clean_messages import clean_file
+
+# Compares the chunked, process-parallel cleaner with the notebook's row-by-row
+# `.apply(emoji.replace_emoji)` on a synthetic raw message CSV.
+# Run from the repository root:
+#   python -m benchmarks.bench_cleaning --rows 2000000 --workers 1 4 8
+# The notebook baseline is slow; it runs on the first --baseline-rows rows only.
+
+SAMPLE_TEXTS = [
+    "Paracetamol 500mg 💊 available now 👍🏽 call 0911 000 000",
+    "ቫይታሚን ሲ 1000mg 🍊🍊 በቅናሽ ዋጋ",
+    "New stock: amoxicillin, ibuprofen & cetirizine 🏥✨",
+    "Skin care set 🧴🧼 🇪🇹 delivery in Addis 🚚",
+    "Price 350 birr only  1️⃣ day left ‼️",
+    "Blood pressure monitor, digital, with warranty",
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Message cleaning benchmark")
+    parser.add_argument('--rows', type=int, default=2000000, help='Synthetic raw rows')
+    parser.add_argument('--baseline-rows', type=int, default=200000, help='Rows cleaned by the notebook baseline')
+    parser.add_argument('--chunksize', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    return parser.parse_args()
+
+# Function to write a synthetic raw CSV with emojis, duplicates, empty texts and future dates
+def make_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    chunk = 500000
+    for start in range(0, rows, chunk):
+        ids = np.arange(start, min(rows, start + chunk))
+        # About 2% of the rows repeat an earlier message id
+        ids = np.where(rng.random(len(ids)) < 0.02, rng.integers(0, max(1, start + 1), len(ids)), ids)
+        texts = np.array(SAMPLE_TEXTS, dtype=object)[rng.integers(0, len(SAMPLE_TEXTS), len(ids))]
+        texts[rng.random(len(ids)) < 0.01] = None
+        dates = pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 400 * 86400, len(ids)), unit='s')
+        pd.DataFrame({
+            'message_id': [f"channel_{i % 50}_{i}" for i in ids],
+            'sender_id': ids % 1000,
+            'message_text': texts,
+            'channel': [f"channel_{i % 50}" for i in ids],
+            'date': dates,
+        }).to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+# The notebook's cleaning, on a fully materialized DataFrame
+def notebook_clean(csv_path, rows, output_path):
+    df = pd.read_csv(csv_path, nrows=rows)
+    df.drop_duplicates(subset='message_id', inplace=True)
+    df.dropna(subset=['message_text'], inplace=True)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df[df['date'] <= pd.Timestamp.now(tz='UTC')]
+    df['message_text'] = df['message_text'].apply(
+        lambda text: emoji.replace_emoji(text, replace='') if isinstance(text, str) else ''
+    )
+    df.to_csv(output_path, index=False)
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        raw_path = os.path.join(folder, 'messages.csv')
+        make_csv(raw_path, args.rows)
+        print(f"Raw CSV: {args.rows} rows, {os.path.getsize(raw_path) / 2**20:.0f} MiB")
+
+        baseline_rows = min(args.rows, args.baseline_rows)
+        start = time.perf_counter()
+        notebook_clean(raw_path, baseline_rows, os.path.join(folder, 'baseline.csv'))
+        elapsed = time.perf_counter() - start
+        print(f"notebook .apply:     {baseline_rows / elapsed:>10.0f} rows/s ({elapsed:.2f}s for {baseline_rows} rows)")
+
+        output_path = os.path.join(folder, 'cleaned.parquet')
+        for workers in args.workers:
+            stats = clean_file(raw_path, output_path, chunksize=args.chunksize, workers=workers)
+            print(f"clean_file x{workers:<3}      {stats['rows_per_second']:>10.0f} rows/s ({stats['seconds']:.2f}s, "
+                  f"{stats['rows_written']} written, {os.path.getsize(output_path) / 2**20:.0f} MiB Parquet)")
+
+if __name__ == '__main__':
+    main()
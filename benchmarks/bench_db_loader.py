@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+from sqlalchemy import create_engine
+from scripts.db_loader import db_config, connect_to_db, create_table, load_csv_to_table
+
+# Compares the COPY + upsert loader with the previous DataFrame.to_sql append
+# against a local PostgreSQL (e.g. `docker run -p 5432:5432 -e POSTGRES_PASSWORD=password postgres`).
+# Run from the repository root:
+#   python -m benchmarks.bench_db_loader --rows 500000
+# Loads into 'medical_data', which is truncated first; do not point it at a database you care about.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="medical_data loader benchmark")
+    parser.add_argument('--rows', type=int, default=200000, help='Synthetic rows to load')
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--skip-to-sql', action='store_true', help='Skip the slow to_sql baseline')
+    return parser.parse_args()
+
+# Function to write a synthetic cleaned CSV
+def make_csv(path, rows):
+    df = pd.DataFrame({
+        'message_id': [f"channel_{i % 50}_{i}" for i in range(rows)],
+        'sender_id': [str(i % 1000) for i in range(rows)],
+        'message_text': [f"paracetamol 500mg tablets, price {i % 300} birr" for i in range(rows)],
+        'channel': [f"channel_{i % 50}" for i in range(rows)],
+        'date': pd.date_range('2024-01-01', periods=rows, freq='s'),
+    })
+    df.to_csv(path, index=False)
+
+def truncate(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("TRUNCATE medical_data")
+    connection.commit()
+
+def main():
+    args = parse_args()
+    connection = connect_to_db(db_config)
+    create_table(connection)
+    with tempfile.TemporaryDirectory() as folder:
+        csv_path = os.path.join(folder, 'cleaned.csv')
+        make_csv(csv_path, args.rows)
+
+        if not args.skip_to_sql:
+            truncate(connection)
+            engine = create_engine(f'postgresql+psycopg2://{db_config["user"]}:{db_config["password"]}@{db_config["host"]}:{db_config["port"]}/{db_config["database"]}')
+            start = time.perf_counter()
+            pd.read_csv(csv_path).to_sql('medical_data', engine, if_exists='append', index=False)
+            elapsed = time.perf_counter() - start
+            print(f"to_sql append:      {args.rows / elapsed:>10.0f} rows/s ({elapsed:.2f}s)")
+
+        truncate(connection)
+        first = load_csv_to_table(csv_path, connection, chunksize=args.chunksize)
+        print(f"COPY load:          {first['rows_per_second']:>10.0f} rows/s ({first['seconds']:.2f}s, "
+              f"{first['rows_merged']} inserted)")
+        # A second load of the same file must succeed and insert nothing
+        second = load_csv_to_table(csv_path, connection, chunksize=args.chunksize)
+        print(f"COPY reload:        {second['rows_per_second']:>10.0f} rows/s ({second['seconds']:.2f}s, "
+              f"{second['rows_merged']} inserted)")
+    connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from scripts.detection.backends import create_backend
+from scripts.detection.engine import DetectionEngine
+
+# CPU benchmark for the pipelined detection engine on a synthetic image folder.
+# Run from the repository root:
+#   python -m benchmarks.bench_detection --images 200 --batch-size 1 4 8 16
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detection engine benchmark")
+    parser.add_argument('--model', type=str, default='yolo11n.pt',
+                        help='Weights to load (.pt, exported .onnx or OpenVINO model directory)')
+    parser.add_argument('--images', type=int, default=200, help='Number of synthetic images')
+    parser.add_argument('--size', type=int, default=640, help='Width and height of synthetic images')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--decode-workers', type=int, default=4)
+    parser.add_argument('--write-workers', type=int, default=2)
+    return parser.parse_args()
+
+# Function to fill a folder with random JPEGs containing a few solid shapes
+def make_images(folder, count, size, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        img = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        for _ in range(3):
+            x, y = (int(v) for v in rng.integers(0, size - 100, 2))
+            cv2.rectangle(img, (x, y), (x + 100, y + 100), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.imwrite(os.path.join(folder, f"bench_{i}.jpg"), img)
+
+def main():
+    args = parse_args()
+    model = create_backend(weights=args.model)
+    with tempfile.TemporaryDirectory() as image_folder, tempfile.TemporaryDirectory() as output_folder:
+        make_images(image_folder, args.images, args.size)
+        # Warm up so model initialisation is not counted against the first configuration
+        list(DetectionEngine(model, batch_size=1).run(image_folder, output_folder, image_files=['bench_0.jpg']))
+
+        print(f"{'batch':>5} {'images':>7} {'seconds':>8} {'img/s':>7} {'decode ms':>10} {'infer ms':>9} {'write ms':>9}")
+        for batch_size in args.batch_size:
+            detector = DetectionEngine(model, batch_size=batch_size, decode_workers=args.decode_workers,
+                                       write_workers=args.write_workers)
+            start = time.perf_counter()
+            processed = sum(1 for _ in detector.run(image_folder, output_folder))
+            elapsed = time.perf_counter() - start
+            stage_ms = detector.timer.per_item_ms()
+            print(f"{batch_size:>5} {processed:>7} {elapsed:>8.2f} {processed / elapsed:>7.1f} "
+                  f"{stage_ms.get('decode', 0):>10.1f} {stage_ms.get('inference', 0):>9.1f} "
+                  f"{stage_ms.get('write', 0):>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import os
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import cv2
+from benchmarks.bench_detection import make_images
+from scripts.detection.backends import BACKENDS, DEFAULT_IMGSZ, create_backend
+from scripts.detection.engine import DetectionEngine, list_images
+
+# Compares the detection backends on a CPU host: model load time, single-image latency,
+# pipelined throughput per batch size, and memory. Each backend runs in its own fresh
+# process, so its peak RSS and thread pools are its own. Run from the repository root:
+#   python -m benchmarks.bench_detection_backends --weights yolo11n.pt --export --threads 4
+# With --export, .pt weights are exported to ONNX and OpenVINO (dynamic batch) next to
+# them unless those files already exist.
+
+# Where Ultralytics writes exports of <stem>.pt
+EXPORTS = {
+    'onnxruntime': ('onnx', lambda stem: f"{stem}.onnx"),
+    'openvino': ('openvino', lambda stem: f"{stem}_openvino_model"),
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detection backend benchmark")
+    parser.add_argument('--weights', type=str, default='yolo11n.pt', help='PyTorch weights the exports come from')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--export', action='store_true', help='Export the .pt weights for the other backends')
+    parser.add_argument('--images', type=int, default=100, help='Number of synthetic images')
+    parser.add_argument('--size', type=int, default=1024, help='Width and height of synthetic images')
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help='Inference input size')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--threads', type=int, default=None, help='Inference threads per backend')
+    parser.add_argument('--latency-runs', type=int, default=30, help='Single-image calls timed for latency')
+    return parser.parse_args()
+
+# Function to find (or with `export`, create) the weights each backend runs on
+def backend_weights(weights, backends, imgsz, export):
+    stem = os.path.splitext(weights)[0]
+    paths = {}
+    for backend in backends:
+        if backend == 'ultralytics':
+            paths[backend] = weights
+            continue
+        export_format, path_of = EXPORTS[backend]
+        path = path_of(stem)
+        if not os.path.exists(path) and export:
+            from ultralytics import YOLO
+
+            path = YOLO(weights).export(format=export_format, imgsz=imgsz, dynamic=True)
+        if os.path.exists(path):
+            paths[backend] = path
+        else:
+            print(f"Skipping {backend}: {path} not found (pass --export to create it)")
+    return paths
+
+def rss_mb():
+    # Current resident set size (Linux); the peak comes from getrusage
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+# Runs in a fresh process per backend
+def measure(backend_name, weights, image_folder, imgsz, batch_sizes, threads, latency_runs):
+    baseline_mb = rss_mb()
+    backend = create_backend(backend_name, weights, imgsz=imgsz, threads=threads)
+    start = time.perf_counter()
+    backend.load()
+    load_seconds = time.perf_counter() - start
+    loaded_mb = rss_mb()
+
+    images = [cv2.imread(os.path.join(image_folder, f)) for f in list_images(image_folder)]
+    backend.predict(images[:1])  # warm-up
+    latencies = []
+    for i in range(latency_runs):
+        start = time.perf_counter()
+        backend.predict([images[i % len(images)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    throughput = {}
+    with tempfile.TemporaryDirectory() as output_folder:
+        for batch_size in batch_sizes:
+            detector = DetectionEngine(backend, batch_size=batch_size, annotate_output=False)
+            start = time.perf_counter()
+            processed = sum(1 for _ in detector.run(image_folder, output_folder))
+            throughput[batch_size] = processed / (time.perf_counter() - start)
+
+    return {
+        'load_seconds': load_seconds,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        'throughput': throughput,
+        'model_mb': loaded_mb - baseline_mb,
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def main():
+    args = parse_args()
+    paths = backend_weights(args.weights, args.backends, args.imgsz, args.export)
+    with tempfile.TemporaryDirectory() as image_folder:
+        make_images(image_folder, args.images, args.size)
+        header = f"{'backend':<12} {'load s':>7} {'p50 ms':>7} {'p99 ms':>7} " + \
+            ' '.join(f"{f'img/s b={b}':>10}" for b in args.batch_size) + f" {'model MB':>9} {'peak MB':>8}"
+        print(header)
+        for backend_name, weights in paths.items():
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+                result = pool.submit(measure, backend_name, weights, image_folder, args.imgsz, args.batch_size,
+                                     args.threads, args.latency_runs).result()
+            print(f"{backend_name:<12} {result['load_seconds']:>7.2f} {result['p50_ms']:>7.1f} "
+                  f"{result['p99_ms']:>7.1f} "
+                  + ' '.join(f"{result['throughput'][b]:>10.1f}" for b in args.batch_size)
+                  + f" {result['model_mb']:>9.0f} {result['peak_mb']:>8.0f}")
+
+if __name__ == '__main__':
+    main()
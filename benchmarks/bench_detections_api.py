@@ -0,0 +1,71 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.setups import crud, models
+
+# Compares OFFSET and keyset (cursor) page latency of crud.get_detections at increasing depth.
+# Run from the repository root (SQLite by default, or point --database-url at a scratch Postgres):
+#   python -m benchmarks.bench_detections_api --rows 1200000 --depths 0 10000 100000 1000000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="/detections pagination benchmark")
+    parser.add_argument('--database-url', type=str, default='sqlite:///data/bench_detections.sqlite')
+    parser.add_argument('--rows', type=int, default=1_200_000, help='Rows to seed when the table is empty')
+    parser.add_argument('--depths', type=int, nargs='+', default=[0, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser.parse_args()
+
+# Function to fill object_detections with synthetic rows
+def seed(engine, rows, chunk=50_000):
+    rng = random.Random(0)
+    classes = ['pill', 'bottle', 'person', 'cup', 'cell phone', 'book']
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for offset in range(0, rows, chunk):
+            connection.execute(insert(models.ObjectDetection), [
+                {
+                    'image_name': f"channel_{i % 40}_{i // 3}.jpg",
+                    'class_name': rng.choice(classes),
+                    'confidence': rng.random(),
+                    'x_min': 0.0, 'y_min': 0.0, 'x_max': 10.0, 'y_max': 10.0,
+                    'detection_time': start + timedelta(seconds=i),
+                }
+                for i in range(offset, min(rows, offset + chunk))
+            ])
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return 1000 * sorted(samples)[len(samples) // 2]
+
+def main():
+    args = parse_args()
+    engine = create_engine(args.database_url)
+    models.Base.metadata.create_all(bind=engine)
+    models.create_indexes(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        if db.query(models.ObjectDetection.id).first() is None:
+            print(f"Seeding {args.rows} rows...")
+            seed(engine, args.rows)
+
+        print(f"{'depth':>9} {'offset ms':>10} {'keyset ms':>10}")
+        for depth in args.depths:
+            offset_ms = timed(lambda: crud.get_detections(db, skip=depth, limit=args.limit), args.repeat)
+            # Locate the row just before the page once (untimed) to build the cursor a client would hold
+            cursor = None
+            if depth:
+                anchor = crud.get_detections(db, skip=depth - 1, limit=1)
+                cursor = crud.encode_cursor(anchor[0]) if anchor else None
+            keyset_ms = timed(lambda: crud.get_detections(db, cursor=cursor, limit=args.limit), args.repeat)
+            print(f"{depth:>9} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+if __name__ == '__main__':
+    main()
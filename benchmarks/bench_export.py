@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+import tracemalloc
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.setups import crud, export, models, schemas
+from benchmarks.bench_detections_api import seed
+
+# Compares the streaming detection export with building the same extract as one list of
+# ORM objects and Pydantic models (what a large GET /detections/ page does). Reports rows/s
+# and peak Python memory (tracemalloc, in a separate untimed pass).
+# Run from the repository root (SQLite by default, or point --database-url at a scratch Postgres,
+# where the export uses a real server-side cursor):
+#   python -m benchmarks.bench_export --rows 1000000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detection export benchmark")
+    parser.add_argument('--database-url', type=str, default='sqlite:///data/bench_detections.sqlite')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Rows to seed when the table is empty')
+    parser.add_argument('--formats', nargs='+', choices=list(export.EXPORT_FORMATS),
+                        default=list(export.EXPORT_FORMATS))
+    parser.add_argument('--chunk-rows', type=int, default=export.EXPORT_CHUNK_ROWS)
+    return parser.parse_args()
+
+def measure(run):
+    start = time.perf_counter()
+    rows, size = run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, size, elapsed, peak
+
+def main():
+    args = parse_args()
+    engine = create_engine(args.database_url)
+    models.Base.metadata.create_all(bind=engine)
+    models.create_indexes(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        if db.query(models.ObjectDetection.id).first() is None:
+            print(f"Seeding {args.rows} rows...")
+            seed(engine, args.rows)
+        total = db.query(models.ObjectDetection.id).count()
+
+    def as_response_list():
+        with Session() as db:
+            detections = crud.get_detections(db, limit=total)
+            body = json.dumps(jsonable_encoder([schemas.ObjectDetection.from_orm(d) for d in detections]))
+        return len(detections), len(body)
+
+    def as_export(export_format):
+        def run():
+            query = export.detections_query()
+            encoder = export.create_encoder(export_format, query)
+            size = sum(len(chunk) for chunk in export.iter_export(engine, query, encoder, 'detections',
+                                                                   chunk_rows=args.chunk_rows))
+            return total, size
+        return run
+
+    print(f"{'method':<22} {'rows':>9} {'MB out':>8} {'seconds':>8} {'rows/s':>9} {'peak MB':>8}")
+    runs = [('response list (JSON)', as_response_list)]
+    runs += [(f"export {export_format}", as_export(export_format)) for export_format in args.formats]
+    for label, run in runs:
+        rows, size, elapsed, peak = measure(run)
+        print(f"{label:<22} {rows:>9} {size / 2**20:>8.1f} {elapsed:>8.2f} {rows / elapsed:>9.0f} {peak / 2**20:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import statistics
+import time
+from sqlalchemy import text
+from app.setups.database import engine, SessionLocal
+from app.setups.search import SEARCH_CONFIG, encode_cursor, messages_table, search_messages
+
+# Compares message search through fct_messages' indexes with the ILIKE '%term%' scans
+# analysts run today, on a synthetic corpus in a scratch table, against a local PostgreSQL
+# (e.g. `docker run -p 5432:5432 -e POSTGRES_PASSWORD=password postgres`). Run from the repository root:
+#   python -m benchmarks.bench_message_search --rows 1000000
+# The scratch table is dropped and recreated on every run.
+
+TABLE = 'bench_fct_messages'
+
+# Common words appear in most messages; 'ivermectin' in one message in a thousand
+VOCABULARY = ['paracetamol', 'amoxicillin', 'ibuprofen', 'vitamin', 'syrup', 'tablets', 'capsules',
+              'cream', 'price', 'birr', 'available', 'delivery', 'addis', 'ababa', 'call', 'pharmacy',
+              'original', 'imported', 'box', 'mg', 'ml', 'new', 'stock', 'order', 'now', 'contact']
+COMMON_TERM = 'paracetamol'
+RARE_TERM = 'ivermectin'
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Message search benchmark")
+    parser.add_argument('--rows', type=int, default=500000, help='Synthetic messages')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query; the median is reported')
+    parser.add_argument('--limit', type=int, default=20, help='Results per page')
+    return parser.parse_args()
+
+# Function to build the scratch table with the same columns as fct_messages, without indexes
+def make_corpus(connection, rows):
+    vocabulary = "ARRAY[" + ", ".join(f"'{word}'" for word in VOCABULARY) + "]"
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    connection.execute(text(f"""
+        CREATE TABLE {TABLE} (
+            message_id TEXT PRIMARY KEY, channel TEXT, sender_id TEXT, message_text TEXT,
+            message_text_normalized TEXT, message_at TIMESTAMP, message_date DATE, search_vector TSVECTOR
+        )
+    """))
+    connection.execute(text(f"""
+        INSERT INTO {TABLE}
+        SELECT 'channel_' || (i % 50) || '_' || i, 'channel_' || (i % 50), (i % 1000)::text,
+               body, lower(body), sent_at, sent_at::date, to_tsvector('{SEARCH_CONFIG}', body)
+        FROM generate_series(1, :rows) AS i
+        CROSS JOIN LATERAL (
+            SELECT string_agg(({vocabulary})[1 + floor(random() * {len(VOCABULARY)})::int], ' ')
+                   || CASE WHEN i % 1000 = 0 THEN ' {RARE_TERM.upper()}' ELSE '' END
+                   || ' ' || (i % 900)::text || ' birr' AS body,
+                   timestamp '2023-01-01' + i * interval '30 seconds' AS sent_at
+            FROM generate_series(1, 12 + i % 8)
+        ) AS message
+    """), {'rows': rows})
+    connection.execute(text(f"ANALYZE {TABLE}"))
+
+# Function to add the search indexes fct_messages gets from dbt
+def create_indexes(connection):
+    connection.execute(text(f"CREATE INDEX ON {TABLE} USING gin (search_vector)"))
+    connection.execute(text(f"CREATE INDEX ON {TABLE} USING gin (message_text_normalized gin_trgm_ops)"))
+    connection.execute(text(f"CREATE INDEX ON {TABLE} (message_at, message_id)"))
+    connection.execute(text(f"ANALYZE {TABLE}"))
+
+def median_ms(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def ilike(term, limit):
+    def run():
+        with engine.connect() as connection:
+            connection.execute(text(f"SELECT message_id FROM {TABLE} WHERE message_text ILIKE :pattern "
+                                    f"ORDER BY message_at DESC LIMIT :limit"),
+                               {'pattern': f"%{term}%", 'limit': limit}).fetchall()
+    return run
+
+def search(table, term, mode, limit, pages=1):
+    def run():
+        with SessionLocal() as db:
+            cursor = None
+            for _ in range(pages):
+                results = search_messages(db, term, mode=mode, limit=limit, cursor=cursor, table=table)
+                if len(results) < limit:
+                    break
+                cursor = encode_cursor(results[-1])
+    return run
+
+def main():
+    args = parse_args()
+    table = messages_table(TABLE)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        make_corpus(connection, args.rows)
+    print(f"Corpus: {args.rows} messages in {time.perf_counter() - start:.1f}s")
+
+    baseline = {term: median_ms(ilike(term, args.limit), args.repeat) for term in (COMMON_TERM, RARE_TERM)}
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        create_indexes(connection)
+    print(f"Indexes built in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'query':<34}{COMMON_TERM + ' (ms)':>20}{RARE_TERM + ' (ms)':>20}")
+    print(f"{'ILIKE scan, no index':<34}{baseline[COMMON_TERM]:>20.1f}{baseline[RARE_TERM]:>20.1f}")
+    for label, mode, pages in (("full-text, ranked", 'fulltext', 1),
+                               ("full-text, first 5 pages", 'fulltext', 5),
+                               ("substring, trigram index", 'substring', 1),
+                               ("substring, first 5 pages", 'substring', 5)):
+        common, rare = (median_ms(search(table, term, mode, args.limit, pages), args.repeat)
+                        for term in (COMMON_TERM, RARE_TERM))
+        print(f"{label:<34}{common:>20.1f}{rare:>20.1f}")
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE {TABLE}"))
+
+if __name__ == '__main__':
+    main()
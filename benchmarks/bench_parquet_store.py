@@ -0,0 +1,74 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scripts.parquet_store import MESSAGE_SCHEMA, iter_message_batches, write_messages
+
+# Compares the partitioned Parquet message dataset with the CSV hand-off it replaces:
+# bytes on disk, a full read, and a read of one day of messages.
+# Run from the repository root:
+#   python -m benchmarks.bench_parquet_store --rows 2000000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Message dataset benchmark")
+    parser.add_argument('--rows', type=int, default=2000000, help='Synthetic messages')
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--days', type=int, default=90)
+    return parser.parse_args()
+
+# Function to build a synthetic message DataFrame spread over channels and days
+def make_messages(rows, channels, days, seed=0):
+    rng = np.random.default_rng(seed)
+    channel = rng.integers(0, channels, rows)
+    return pd.DataFrame({
+        'message_id': [f"channel_{c}_{i}" for i, c in enumerate(channel)],
+        'sender_id': (rng.integers(0, 5000, rows)).astype(str),
+        'message_text': [f"paracetamol 500mg tablets, price {p} birr" for p in rng.integers(0, 300, rows)],
+        'channel': [f"channel_{c}" for c in channel],
+        'date': pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, days * 86400, rows), unit='s'),
+    })
+
+def folder_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def timed(label, fn):
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:>7.2f}s ({rows} rows)")
+
+def main():
+    args = parse_args()
+    df = make_messages(args.rows, args.channels, args.days)
+    day = date(2024, 1, 15)
+    with tempfile.TemporaryDirectory() as folder:
+        csv_path = os.path.join(folder, 'messages.csv')
+        dataset_path = os.path.join(folder, 'messages')
+        df.to_csv(csv_path, index=False)
+        write_messages(pa.Table.from_pandas(df, schema=MESSAGE_SCHEMA, preserve_index=False), dataset_path)
+        print(f"CSV size:     {os.path.getsize(csv_path) / 2**20:>8.1f} MiB")
+        print(f"Dataset size: {folder_size(dataset_path) / 2**20:>8.1f} MiB")
+
+        def read_csv(selected_day=None):
+            frame = pd.read_csv(csv_path, dtype={'message_id': str, 'sender_id': str})
+            frame['date'] = pd.to_datetime(frame['date'], utc=True)
+            if selected_day is not None:
+                frame = frame[frame['date'].dt.date == selected_day]
+            return len(frame)
+
+        def read_dataset(selected_day=None):
+            until = None if selected_day is None else date.fromordinal(selected_day.toordinal() + 1)
+            return sum(len(batch.to_pandas())
+                       for batch in iter_message_batches(dataset_path, since=selected_day, until=until))
+
+        timed("CSV full read", read_csv)
+        timed("Dataset full read", read_dataset)
+        timed(f"CSV read of {day}", lambda: read_csv(day))
+        timed(f"Dataset read of {day}", lambda: read_dataset(day))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import resource
+import tempfile
+import time
+from benchmarks.fake_telegram import FakeTelegramClient
+from scripts.media_downloader import MediaDownloadPool
+from scripts.telegram_scraper import scrape_telegram_channels
+
+# Benchmark for the concurrent channel scraper against the fake Telegram client.
+# Run from the repository root:
+#   python -m benchmarks.bench_scraper --channels 200 --concurrency 1 4 16 64
+
+class CountingSink:
+    """Sink that only counts rows, so the benchmark measures scraping rather than disk I/O."""
+
+    def __init__(self):
+        self.rows = 0
+
+    def write_batch(self, messages):
+        self.rows += len(messages)
+
+    def close(self):
+        pass
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scraper concurrency benchmark")
+    parser.add_argument('--channels', type=int, default=50, help='Number of synthetic channels')
+    parser.add_argument('--messages', type=int, default=300, help='Messages per channel')
+    parser.add_argument('--page-size', type=int, default=100, help='Messages returned per API request')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per API request')
+    parser.add_argument('--flood-wait-rate', type=float, default=0.0, help='Probability a request raises a flood wait')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per sink write')
+    parser.add_argument('--photo-rate', type=float, default=0.0, help='Fraction of messages carrying a photo')
+    parser.add_argument('--download-parallelism', type=int, default=4, help='Concurrent photo downloads')
+    return parser.parse_args()
+
+async def run_once(args, concurrency):
+    client = FakeTelegramClient(messages_per_channel=args.messages, page_size=args.page_size,
+                                latency=args.latency, flood_wait_rate=args.flood_wait_rate,
+                                photo_rate=args.photo_rate)
+    channels = [f"channel_{i}" for i in range(args.channels)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        downloads = MediaDownloadPool(output_dir=output_dir, parallelism=args.download_parallelism,
+                                      index_path=f"{output_dir}/media_index.sqlite").start()
+        start = time.perf_counter()
+        try:
+            count = await scrape_telegram_channels(client, channels, CountingSink(), downloads=downloads,
+                                                   media_channels=channels, concurrency=concurrency,
+                                                   batch_size=args.batch_size)
+        finally:
+            await downloads.close()
+        elapsed = time.perf_counter() - start
+    return count, elapsed, client.flood_waits
+
+def main():
+    args = parse_args()
+    print(f"{'concurrency':>11} {'messages':>10} {'seconds':>9} {'msg/s':>10} {'flood waits':>12}")
+    for concurrency in args.concurrency:
+        count, elapsed, flood_waits = asyncio.run(run_once(args, concurrency))
+        print(f"{concurrency:>11} {count:>10} {elapsed:>9.2f} {count / elapsed:>10.0f} {flood_waits:>12}")
+    # ru_maxrss is in kilobytes on Linux; it stays flat as --messages grows
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS: {peak_mb:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from telethon.errors import FloodWaitError
+
+# Stand-in for telethon's TelegramClient used by the scraper benchmarks.
+# It serves synthetic channels with a configurable per-request latency and
+# can raise flood waits, so the scraper's concurrency and backoff paths can be
+# exercised without a Telegram account or network access.
+
+class FakeMessage:
+    def __init__(self, message_id, sender_id, text, date, photo=None):
+        self.id = message_id
+        self.sender_id = sender_id
+        self.text = text
+        self.date = date
+        self.photo = photo
+
+    async def download_media(self, file=None):
+        # Pretend to fetch a small JPEG
+        payload = b'\xff\xd8\xff' + self.id.to_bytes(8, 'big') + b'\x00' * 1024
+        if file is bytes:
+            return payload
+        with open(file, 'wb') as handle:
+            handle.write(payload)
+        return file
+
+class FakeTelegramClient:
+    """Serves `messages_per_channel` messages for every channel name it is asked for.
+
+    Messages come in pages of `page_size`; each page costs `latency` seconds,
+    which is how telethon's `iter_messages` behaves against the real API.
+    With `flood_wait_rate` > 0 a page request occasionally raises
+    `FloodWaitError` with `flood_wait_seconds`.
+    """
+
+    def __init__(self, messages_per_channel=500, page_size=100, latency=0.05,
+                 flood_wait_rate=0.0, flood_wait_seconds=1, photo_rate=0.0, seed=0):
+        self.messages_per_channel = messages_per_channel
+        self.page_size = page_size
+        self.latency = latency
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.photo_rate = photo_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.flood_waits = 0
+
+    async def start(self, phone=None):
+        return self
+
+    def _message(self, username, message_id):
+        base_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        photo = object() if self.random.random() < self.photo_rate else None
+        return FakeMessage(
+            message_id=message_id,
+            sender_id=hash(username) % 100000,
+            text=f"{username} message {message_id} paracetamol 500mg available",
+            date=base_date + timedelta(minutes=message_id),
+            photo=photo,
+        )
+
+    async def iter_messages(self, username, min_id=0, reverse=False, limit=None):
+        ids = list(range(min_id + 1, self.messages_per_channel + 1))
+        if not reverse:
+            ids.reverse()
+        if limit is not None:
+            ids = ids[:limit]
+        for start in range(0, len(ids), self.page_size):
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            if self.flood_wait_rate and self.random.random() < self.flood_wait_rate:
+                self.flood_waits += 1
+                raise FloodWaitError(request=None, capture=self.flood_wait_seconds)
+            for message_id in ids[start:start + self.page_size]:
+                yield self._message(username, message_id)
@@ -0,0 +1,14 @@
+-- Derives the keys and normalised text the marts are built from
+select
+  message_id,
+  -- Messages scraped before ids were stable carry a uuid and have no Telegram id
+  nullif(substring(message_id from '_([0-9]+)$'), '')::bigint as telegram_message_id,
+  md5(channel) as channel_key,
+  channel,
+  sender_id,
+  message_text,
+  lower(message_text) as message_text_normalized,  -- Convert message text to lowercase
+  message_at,
+  message_at::date as message_date,
+  loaded_at
+from {{ ref('stg_messages') }}
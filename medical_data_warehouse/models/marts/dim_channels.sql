@@ -0,0 +1,43 @@
+-- Channel dimension, updated from newly loaded messages only
+{{ config(
+    materialized='incremental',
+    unique_key='channel_key',
+    incremental_strategy='delete+insert',
+    indexes=[{'columns': ['channel_key'], 'unique': True}]
+) }}
+
+with new_messages as (
+    select
+      channel_key,
+      channel,
+      min(message_date) as first_message_date,
+      max(message_date) as last_message_date,
+      max(loaded_at) as last_loaded_at
+    from {{ ref('int_messages_enriched') }}
+    {% if is_incremental() %}
+    -- Same lookback as fct_messages, for loads that committed after the last run
+    where loaded_at > (select coalesce(max(last_loaded_at), '1900-01-01'::timestamp) from {{ this }})
+                      - interval '{{ var("loaded_at_lookback") }}'
+    {% endif %}
+    group by channel_key, channel
+)
+
+select
+  n.channel_key,
+  n.channel,
+  {% if is_incremental() %}
+  least(n.first_message_date, d.first_message_date) as first_message_date,
+  greatest(n.last_message_date, d.last_message_date) as last_message_date,
+  {% else %}
+  n.first_message_date,
+  n.last_message_date,
+  {% endif %}
+  {% if is_incremental() %}
+  greatest(n.last_loaded_at, d.last_loaded_at) as last_loaded_at
+  {% else %}
+  n.last_loaded_at
+  {% endif %}
+from new_messages n
+{% if is_incremental() %}
+left join {{ this }} d on d.channel_key = n.channel_key
+{% endif %}
@@ -0,0 +1,21 @@
+-- Calendar dimension; a fixed-size generated table, so rebuilding it is cheap
+{{ config(
+    materialized='table',
+    indexes=[{'columns': ['date_day'], 'unique': True}]
+) }}
+
+select
+  d::date as date_day,
+  extract(year from d)::int as year,
+  extract(quarter from d)::int as quarter,
+  extract(month from d)::int as month,
+  to_char(d, 'Month') as month_name,
+  extract(week from d)::int as iso_week,
+  extract(isodow from d)::int as iso_day_of_week,
+  to_char(d, 'Day') as day_name,
+  extract(isodow from d) in (6, 7) as is_weekend
+from generate_series(
+  '{{ var("calendar_start", "2015-01-01") }}'::date,
+  (current_date + interval '1 year')::date,
+  interval '1 day'
+) as d
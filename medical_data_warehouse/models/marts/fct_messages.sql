@@ -0,0 +1,50 @@
+-- Message fact table. Incremental: each run only reads rows whose loaded_at is
+-- newer than the latest one already in the table, less var('loaded_at_lookback'),
+-- and replaces them by message_id.
+--
+-- Partition/index strategy: rows arrive roughly in message_date order, so a BRIN
+-- index on message_date gives date-range pruning at a tiny size; a btree on
+-- (channel_key, message_date) serves per-channel time slices, and the unique
+-- index on message_id makes the delete+insert merge an index lookup per row.
+--
+-- Search (GET /messages/search): search_vector holds the message's lexemes under
+-- the `search_config` text search configuration, with a GIN index for ranked
+-- full-text queries; a pg_trgm GIN index on message_text_normalized answers
+-- substring matches (LIKE '%term%') without a sequential scan, and the
+-- (message_at, message_id) btree serves the newest-first keyset pages.
+{{ config(
+    materialized='incremental',
+    unique_key='message_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    indexes=[
+      {'columns': ['message_id'], 'unique': True},
+      {'columns': ['message_date'], 'type': 'brin'},
+      {'columns': ['channel_key', 'message_date']},
+      {'columns': ['loaded_at']},
+      {'columns': ['search_vector'], 'type': 'gin'},
+      {'columns': ['message_text_normalized gin_trgm_ops'], 'type': 'gin'},
+      {'columns': ['message_at', 'message_id']},
+    ]
+) }}
+
+select
+  message_id,
+  telegram_message_id,
+  channel_key,
+  channel,
+  sender_id,
+  message_text,
+  message_text_normalized,
+  message_at,
+  message_date,
+  to_tsvector('{{ var("search_config") }}'::regconfig, coalesce(message_text, '')) as search_vector,
+  loaded_at
+from {{ ref('int_messages_enriched') }}
+{% if is_incremental() %}
+-- Re-read a lookback window: loaded_at is the loading transaction's start time, so a
+-- load that began before the last run but committed after it has older timestamps.
+-- The merge on message_id makes re-reading those rows idempotent.
+where loaded_at > (select coalesce(max(loaded_at), '1900-01-01'::timestamp) from {{ this }})
+                  - interval '{{ var("loaded_at_lookback") }}'
+{% endif %}
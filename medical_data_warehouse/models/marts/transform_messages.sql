@@ -0,0 +1,10 @@
+-- Kept for existing queries: the lowercase message view formerly built as a full table
+{{ config(materialized='view') }}
+
+select
+  message_id,
+  sender_id,
+  message_text_normalized as message_text,
+  channel,
+  message_at as date
+from {{ ref('fct_messages') }}
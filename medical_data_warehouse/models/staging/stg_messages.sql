@@ -1,5 +1,4 @@
-{{ config(materialized='table') }}
-
+-- One row per loaded message, with types normalised; no business logic here
 with raw as (
     select *
     from {{ source('public', 'medical_data') }}
@@ -8,7 +7,8 @@ with raw as (
 select
   message_id,
   sender_id,
-  lower(message_text) as message_text,  -- Convert message text to lowercase
+  message_text,
   channel,
-  date
+  date as message_at,
+  loaded_at
 from raw
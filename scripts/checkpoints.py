@@ -0,0 +1,70 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+# Default location of the scraper's checkpoint database
+DEFAULT_CHECKPOINT_DB = 'data/state/checkpoints.sqlite'
+
+create_table_query = """
+CREATE TABLE IF NOT EXISTS channel_checkpoints (
+    channel TEXT PRIMARY KEY,
+    last_message_id INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Function to build the stable key of a scraped message
+def message_key(channel, telegram_id):
+    return f"{channel}_{telegram_id}"
+
+# Function to recover (channel, telegram id) from a message key
+def split_message_key(message_id):
+    channel, telegram_id = message_id.rsplit('_', 1)
+    return channel, int(telegram_id)
+
+class CheckpointStore:
+    """Records the highest Telegram message id stored per channel.
+
+    A channel's checkpoint only moves forward, and callers advance it after the
+    messages up to that id have been written to the sink, so a crashed run
+    resumes where the last durable batch ended.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(create_table_query)
+        self.connection.commit()
+
+    def get(self, channel):
+        row = self.connection.execute(
+            "SELECT last_message_id FROM channel_checkpoints WHERE channel = ?", (channel,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def start_ids(self, channels, min_id=None):
+        """Returns the id to resume each channel from, never below `min_id`."""
+        return {channel: max(self.get(channel), min_id or 0) for channel in channels}
+
+    def advance(self, positions):
+        """Moves checkpoints forward to the given {channel: message id} positions."""
+        now = datetime.now(timezone.utc).isoformat()
+        self.connection.executemany(
+            """
+            INSERT INTO channel_checkpoints (channel, last_message_id, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(channel) DO UPDATE SET
+                last_message_id = MAX(last_message_id, excluded.last_message_id),
+                updated_at = excluded.updated_at
+            """,
+            [(channel, message_id, now) for channel, message_id in positions.items()],
+        )
+        self.connection.commit()
+
+    def reset(self, channels):
+        self.connection.executemany(
+            "DELETE FROM channel_checkpoints WHERE channel = ?", [(channel,) for channel in channels]
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
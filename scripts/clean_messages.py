@@ -0,0 +1,194 @@
+import os
+import re
+import time
+import argparse
+import logging
+from datetime import date
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import emoji
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scripts.parquet_store import (DEFAULT_CLEANED_DATASET, DEFAULT_RAW_DATASET, MESSAGE_SCHEMA,
+                                   clear_partitions, iter_message_batches, write_messages)
+
+# Default input and output of the cleaning stage
+DEFAULT_INPUT = DEFAULT_RAW_DATASET
+DEFAULT_OUTPUT = DEFAULT_CLEANED_DATASET
+
+# Columns of the raw and cleaned message files
+MESSAGE_COLUMNS = ['message_id', 'sender_id', 'message_text', 'channel', 'date']
+
+# Runs of whitespace left behind once emojis are removed
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def _trie_pattern(node, root=False):
+    # Single-character leaves become one character class and longer sequences are tried
+    # before their prefixes. The root stays a plain alternation of literals, which lets
+    # the regex engine skip non-emoji positions using the set of first characters.
+    leaves = [] if root else [char for char, child in node.items() if char and child == {'': {}}]
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char and char not in leaves]
+    if leaves:
+        branches.append('[' + ''.join(re.escape(char) for char in sorted(leaves)) + ']')
+    if root or not branches:
+        return '|'.join(branches)
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return f'(?:{pattern})?' if '' in node else pattern
+
+@lru_cache(maxsize=None)
+def emoji_pattern():
+    """Compiles one regex matching every emoji in emoji.EMOJI_DATA, longest sequence first.
+
+    The emojis are arranged as a trie, so each position is matched by walking
+    shared prefixes instead of trying thousands of alternatives in turn. The
+    pattern is built once per process.
+    """
+    trie = {}
+    for sequence in emoji.EMOJI_DATA:
+        node = trie
+        for char in sequence:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return re.compile(_trie_pattern(trie, root=True))
+
+def clean_text(series):
+    """Removes emojis, normalizes to NFC and collapses whitespace in a Series of strings."""
+    series = series.str.replace(emoji_pattern(), '', regex=True)
+    series = series.str.normalize('NFC')
+    return series.str.replace(WHITESPACE_PATTERN, ' ', regex=True).str.strip()
+
+def clean_chunk(df, now):
+    """Cleans one chunk of raw messages: drops empty texts and future or invalid dates, cleans the text.
+
+    Runs in a worker process; `now` is passed in so every chunk uses the same cutoff.
+    """
+    df = df.dropna(subset=['message_text'])
+    df = df.assign(date=pd.to_datetime(df['date'], errors='coerce', utc=True))
+    df = df[df['date'] <= now]
+    return df.assign(message_text=clean_text(df['message_text']))[MESSAGE_COLUMNS]
+
+class CleanedWriter:
+    """Writes cleaned chunks to the partitioned message dataset at `path`.
+
+    A path ending in .parquet is written as a single file (one row group per
+    chunk) and one ending in .csv as CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.kind = 'csv' if path.endswith('.csv') else 'file' if path.endswith('.parquet') else 'dataset'
+        os.makedirs(path if self.kind == 'dataset' else os.path.dirname(path) or '.', exist_ok=True)
+        self.writer = pq.ParquetWriter(path, MESSAGE_SCHEMA, compression='zstd') if self.kind == 'file' else None
+        self.header = True
+
+    def write(self, df):
+        if self.kind == 'csv':
+            df.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+            self.header = False
+            return
+        table = pa.Table.from_pandas(df, schema=MESSAGE_SCHEMA, preserve_index=False)
+        if self.kind == 'file':
+            self.writer.write_table(table)
+        else:
+            write_messages(table, self.path)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+# Function to read raw messages in chunks from a CSV file or a message dataset directory
+def read_chunks(input_path, chunksize, channels=None, since=None, until=None):
+    if os.path.isdir(input_path):
+        for batch in iter_message_batches(input_path, channels, since, until, batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(input_path, chunksize=chunksize, usecols=MESSAGE_COLUMNS,
+                           dtype={'message_id': str, 'sender_id': str, 'message_text': str, 'channel': str})
+
+def clean_file(input_path, output_path, chunksize=200000, workers=None, channels=None, since=None, until=None):
+    """Streams raw messages through clean_chunk on a process pool into `output_path`.
+
+    The input is a raw CSV or a message dataset directory, of which only the
+    partitions selected by `channels` and the [since, until) date range are read.
+
+    When writing a dataset, the same selection of output partitions is
+    replaced, so cleaning a channel or day again does not duplicate it.
+
+    Duplicate message ids are dropped in the parent, keeping the first
+    occurrence across the whole file as the notebook did; chunks are written in
+    input order. At most two chunks per worker are in flight, so memory is
+    bounded by the chunk size rather than the file size.
+
+    Returns a dict with the rows read, duplicates, dropped rows, rows written,
+    elapsed seconds and rows/second.
+    """
+    workers = workers or os.cpu_count() or 1
+    now = pd.Timestamp.now(tz='UTC')
+    seen = set()
+    stats = {'rows_read': 0, 'duplicates': 0, 'rows_dropped': 0, 'rows_written': 0}
+    writer = CleanedWriter(output_path)
+    if writer.kind == 'dataset':
+        clear_partitions(output_path, channels, since, until)
+    start = time.perf_counter()
+
+    def collect(future, submitted):
+        cleaned = future.result()
+        stats['rows_dropped'] += submitted - len(cleaned)
+        stats['rows_written'] += len(cleaned)
+        writer.write(cleaned)
+
+    try:
+        # Spawned workers stay safe when the caller also runs threads (e.g. the pipeline's detection stage)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            pending = []
+            for chunk in read_chunks(input_path, chunksize, channels, since, until):
+                stats['rows_read'] += len(chunk)
+                unique = chunk.drop_duplicates(subset='message_id')
+                unique = unique[~unique['message_id'].isin(seen)]
+                seen.update(unique['message_id'])
+                stats['duplicates'] += len(chunk) - len(unique)
+                pending.append((pool.submit(clean_chunk, unique, now), len(unique)))
+                if len(pending) >= 2 * workers:
+                    collect(*pending.pop(0))
+            for future, submitted in pending:
+                collect(future, submitted)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = elapsed
+    stats['rows_per_second'] = stats['rows_read'] / elapsed if elapsed else 0.0
+    logging.info(
+        f"Cleaned {stats['rows_read']} rows from {input_path} into {output_path}: {stats['rows_written']} written, "
+        f"{stats['duplicates']} duplicates, {stats['rows_dropped']} dropped, "
+        f"{elapsed:.2f}s, {stats['rows_per_second']:.0f} rows/s."
+    )
+    return stats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean scraped Telegram messages")
+    parser.add_argument('--input', type=str, default=DEFAULT_INPUT, help='Raw message dataset directory or CSV')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT,
+                        help='Cleaned dataset directory, or a single .parquet or .csv file')
+    parser.add_argument('--channel', action='append', help='Only clean this channel (repeatable; dataset input)')
+    parser.add_argument('--since', type=date.fromisoformat, help='First message date to clean (dataset input)')
+    parser.add_argument('--until', type=date.fromisoformat, help='Clean messages before this date (dataset input)')
+    parser.add_argument('--chunksize', type=int, default=200000, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = clean_file(args.input, args.output, chunksize=args.chunksize, workers=args.workers,
+                       channels=args.channel, since=args.since, until=args.until)
+    print(f"Cleaned {stats['rows_read']} rows ({stats['rows_written']} written, {stats['duplicates']} duplicates, "
+          f"{stats['rows_dropped']} dropped) in {stats['seconds']:.2f}s: {stats['rows_per_second']:.0f} rows/s")
+
+if __name__ == '__main__':
+    # Logging setup
+    logging.basicConfig(filename='logs/data_cleaning.log', level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
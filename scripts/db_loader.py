@@ -1,10 +1,12 @@
+import io
 import os
+import time
+import argparse
+from datetime import date
 import pandas as pd
 import psycopg2
+from app.setups.metrics import REGISTRY, DB_FLUSH_SECONDS, DB_ROWS_WRITTEN
 import logging
-from psycopg2 import sql
-from sqlalchemy import create_engine
-from contextlib import closing
 
 # Logging setup
 logging.basicConfig(filename='logs/database_operations.log', level=logging.INFO,
@@ -26,8 +28,12 @@ CREATE TABLE IF NOT EXISTS medical_data (
     sender_id TEXT,
     message_text TEXT,
     channel TEXT,
-    date TIMESTAMP
+    date TIMESTAMP,
+    loaded_at TIMESTAMP NOT NULL DEFAULT now()
 );
+-- Tables created before loaded_at existed; the dbt models filter on it incrementally
+ALTER TABLE medical_data ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS ix_medical_data_loaded_at ON medical_data (loaded_at);
 """
 
 def connect_to_db(db_config):
@@ -58,18 +64,107 @@ def create_table(connection):
         logging.error(f"Error creating the table: {e}")
         raise
 
-def insert_data_to_table(df, connection):
-    """Inserts cleaned data from the DataFrame into the 'medical_data' table."""
+# Columns loaded into 'medical_data', in table order
+columns = ['message_id', 'sender_id', 'message_text', 'channel', 'date']
+
+# Merge statements from the staging table, keyed on the primary key
+merge_queries = {
+    'nothing': """
+        INSERT INTO medical_data ({cols})
+        SELECT DISTINCT ON (message_id) {cols} FROM medical_data_staging
+        ON CONFLICT (message_id) DO NOTHING
+    """,
+    'update': """
+        INSERT INTO medical_data ({cols})
+        SELECT DISTINCT ON (message_id) {cols} FROM medical_data_staging
+        ON CONFLICT (message_id) DO UPDATE SET {updates}
+    """,
+}
+
+def create_staging_table(connection):
+    """Creates a session-local staging table shaped like 'medical_data'."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS medical_data_staging "
+            "(LIKE medical_data INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+    connection.commit()
+
+def copy_chunk(df, connection, on_conflict='nothing'):
+    """COPYs one DataFrame chunk into staging and merges it into 'medical_data'.
+
+    Returns the number of rows newly inserted (or updated) by the merge. The
+    chunk is committed as one transaction, so a failed chunk leaves earlier
+    chunks loaded and the whole load can simply be re-run.
+    """
+    buffer = io.StringIO()
+    df[columns].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cols = ', '.join(columns)
+    updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in columns if col != 'message_id')
+    # Updated rows must be picked up again by the incremental dbt models
+    updates += ', loaded_at = now()'
+    start = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY medical_data_staging ({cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(merge_queries[on_conflict].format(cols=cols, updates=updates))
+            merged = cursor.rowcount
+        connection.commit()
+        DB_FLUSH_SECONDS.observe(time.perf_counter() - start, writer='loader')
+        DB_ROWS_WRITTEN.inc(merged, writer='loader')
+        return merged
+    except Exception:
+        connection.rollback()
+        raise
+
+def load_chunks(chunks, source, connection, on_conflict='nothing'):
+    """Merges an iterable of DataFrame chunks into 'medical_data' through COPY and an upsert.
+
+    Returns a dict with the rows read, rows merged, elapsed seconds and rows/second.
+    """
+    create_staging_table(connection)
+    rows_read = 0
+    rows_merged = 0
+    start = time.perf_counter()
     try:
-        # Using SQLAlchemy to bulk insert data from DataFrame
-        engine = create_engine(f'postgresql+psycopg2://{db_config["user"]}:{db_config["password"]}@{db_config["host"]}:{db_config["port"]}/{db_config["database"]}')
-        
-        # Insert data
-        df.to_sql('medical_data', engine, if_exists='append', index=False)
-        logging.info(f"Successfully inserted {len(df)} records into 'medical_data' table.")
+        for chunk in chunks:
+            rows_read += len(chunk)
+            rows_merged += copy_chunk(chunk, connection, on_conflict=on_conflict)
+            logging.info(f"Loaded {rows_read} rows from {source} so far ({rows_merged} merged).")
     except Exception as e:
-        logging.error(f"Error inserting data into the table: {e}")
+        logging.error(f"Error loading {source} into the table: {e}")
         raise
+    elapsed = time.perf_counter() - start
+    stats = {
+        'rows_read': rows_read,
+        'rows_merged': rows_merged,
+        'seconds': elapsed,
+        'rows_per_second': rows_read / elapsed if elapsed else 0.0,
+    }
+    logging.info(
+        f"Loaded {rows_read} rows into 'medical_data' ({rows_merged} new or updated) "
+        f"in {elapsed:.2f}s, {stats['rows_per_second']:.0f} rows/s."
+    )
+    return stats
+
+def load_csv_to_table(csv_path, connection, chunksize=50000, on_conflict='nothing'):
+    """Streams a CSV into 'medical_data' chunk by chunk; see load_chunks."""
+    chunks = pd.read_csv(csv_path, chunksize=chunksize, dtype={'message_id': str, 'sender_id': str})
+    return load_chunks(chunks, csv_path, connection, on_conflict=on_conflict)
+
+def load_dataset_to_table(base_dir, connection, chunksize=50000, on_conflict='nothing',
+                          channels=None, since=None, until=None):
+    """Loads the selected partitions of a message dataset into 'medical_data'; see load_chunks.
+
+    Only the partitions matching `channels` and the [since, until) date range
+    are read, as typed Arrow batches, so nothing is re-parsed from text.
+    """
+    from scripts.parquet_store import iter_message_batches
+
+    chunks = (batch.to_pandas() for batch in
+              iter_message_batches(base_dir, channels, since, until, batch_size=chunksize))
+    return load_chunks(chunks, base_dir, connection, on_conflict=on_conflict)
 
 def close_connection(connection):
     """Closes the database connection."""
@@ -77,19 +172,39 @@ def close_connection(connection):
         connection.close()
         logging.info("PostgreSQL connection closed successfully.")
 
-def main():
-    try:
-        # Load cleaned data from CSV
-        df = pd.read_csv('data/cleaned/cleaned_data.csv')
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load cleaned messages into PostgreSQL")
+    parser.add_argument('--input', type=str, default='data/cleaned/messages',
+                        help='Cleaned message dataset directory or CSV to load')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Rows per COPY chunk')
+    parser.add_argument('--on-conflict', choices=['nothing', 'update'], default='nothing',
+                        help='Keep (nothing) or overwrite (update) rows whose message_id is already loaded')
+    parser.add_argument('--channel', action='append', help='Only load this channel (repeatable; dataset input)')
+    parser.add_argument('--since', type=date.fromisoformat, help='First message date to load (dataset input)')
+    parser.add_argument('--until', type=date.fromisoformat, help='Load messages before this date (dataset input)')
+    return parser.parse_args(argv)
 
+def main(argv=None):
+    args = parse_args(argv)
+    connection = None
+    try:
         # Connect to the PostgreSQL database
         connection = connect_to_db(db_config)
 
         # Create the table if it doesn't exist
         create_table(connection)
 
-        # Insert the data into the table
-        insert_data_to_table(df, connection)
+        # Stream the cleaned dataset or CSV into the table
+        if os.path.isdir(args.input):
+            stats = load_dataset_to_table(args.input, connection, chunksize=args.chunksize,
+                                          on_conflict=args.on_conflict, channels=args.channel,
+                                          since=args.since, until=args.until)
+        else:
+            stats = load_csv_to_table(args.input, connection, chunksize=args.chunksize,
+                                      on_conflict=args.on_conflict)
+        REGISTRY.log_summary(logging.getLogger(__name__))
+        print(f"Loaded {stats['rows_read']} rows ({stats['rows_merged']} new or updated) "
+              f"in {stats['seconds']:.2f}s: {stats['rows_per_second']:.0f} rows/s")
 
     except Exception as e:
         logging.error(f"An error occurred during the database operation: {e}")
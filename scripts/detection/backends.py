@@ -0,0 +1,258 @@
+import os
+import ast
+import glob
+import logging
+import threading
+import cv2
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Weights used when none are given; a .pt file runs on Ultralytics/PyTorch, an exported
+# .onnx file on ONNX Runtime and an exported OpenVINO model directory (or .xml) on OpenVINO
+DEFAULT_WEIGHTS = os.getenv('DETECTION_WEIGHTS', 'yolo11n.pt')
+
+# Inference settings; the defaults are Ultralytics' own
+DEFAULT_IMGSZ = 640
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+MAX_DETECTIONS = 300
+
+# Grey used by Ultralytics to pad letterboxed images
+PAD_VALUE = 114
+
+# Every backend turns a list of BGR images into one (N, 6) float array per image with
+# rows of x_min, y_min, x_max, y_max, confidence, class id in the image's own pixel
+# coordinates (the layout of Ultralytics' Boxes.data), and maps class ids to names.
+
+class DetectionBackend:
+    """Base class of the detection backends: lazy, thread-safe model loading and settings.
+
+    The model is loaded on the first call to predict() (or to load()), not when
+    the backend is created, so building a backend is cheap and importing this
+    module loads no model or inference runtime.
+    """
+
+    name = None
+
+    def __init__(self, weights, imgsz=DEFAULT_IMGSZ, conf=DEFAULT_CONF, iou=DEFAULT_IOU, threads=None):
+        self.weights = weights
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.threads = threads
+        self.names = None
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def model_id(self):
+        """Identifies the model and its settings in the processed-image manifest.
+
+        The weights file name alone when the settings are the defaults, so the
+        manifests of earlier runs stay valid.
+        """
+        model_id = os.path.basename(os.path.normpath(self.weights))
+        settings = (('imgsz', self.imgsz, DEFAULT_IMGSZ), ('conf', self.conf, DEFAULT_CONF),
+                    ('iou', self.iou, DEFAULT_IOU))
+        changed = [f"{key}={value}" for key, value, default in settings if value != default]
+        return model_id + (f"@{','.join(changed)}" if changed else '')
+
+    def load(self):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+        return self
+
+    def predict(self, images):
+        self.load()
+        return self._predict(images)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _predict(self, images):
+        raise NotImplementedError
+
+class UltralyticsBackend(DetectionBackend):
+    """PyTorch weights (.pt) through Ultralytics, which also does the pre- and post-processing."""
+
+    name = 'ultralytics'
+
+    def _load(self):
+        import torch
+        from ultralytics import YOLO
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = YOLO(self.weights)
+        self.names = self.model.names
+
+    def _predict(self, images):
+        results = self.model(images, imgsz=self.imgsz, conf=self.conf, iou=self.iou, max_det=MAX_DETECTIONS,
+                             verbose=False)
+        return [result.boxes.data.cpu().numpy().astype(np.float32) if result.boxes is not None
+                else np.empty((0, 6), np.float32) for result in results]
+
+# Function to resize an image into a size x size square, keeping its aspect ratio and padding the rest
+def letterbox(img, size):
+    height, width = img.shape[:2]
+    scale = min(size / height, size / width)
+    new_height, new_width = round(height * scale), round(width * scale)
+    top, left = (size - new_height) // 2, (size - new_width) // 2
+    canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    canvas[top:top + new_height, left:left + new_width] = cv2.resize(img, (new_width, new_height),
+                                                                     interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (left, top)
+
+# Function to decode one image's raw YOLOv8/YOLO11 head output, shaped (4 + classes, anchors)
+# with boxes as centre x, centre y, width, height, into (N, 6) detections in image coordinates
+def decode_output(output, conf, iou, scale, pad, image_shape):
+    predictions = output.T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+    keep = scores >= conf
+    if not keep.any():
+        return np.empty((0, 6), np.float32)
+    centres, sizes = predictions[keep, :2], predictions[keep, 2:4]
+    scores, class_ids = scores[keep], class_ids[keep]
+
+    # Class-aware NMS: shifting each class's boxes by its own offset keeps boxes of
+    # different classes from ever overlapping, so a single NMS pass suffices
+    corners = centres - sizes / 2
+    offsets = class_ids[:, None].astype(np.float32) * (float((corners + sizes).max()) + 1)
+    kept = cv2.dnn.NMSBoxes(np.hstack([corners + offsets, sizes]).tolist(), scores.tolist(), conf, iou,
+                            top_k=MAX_DETECTIONS)
+    kept = np.asarray(kept, dtype=np.int64).reshape(-1)[:MAX_DETECTIONS]
+
+    # Undo the letterbox and clip to the image
+    left, top = pad
+    boxes = np.hstack([corners[kept], corners[kept] + sizes[kept]])
+    boxes = (boxes - np.array([left, top, left, top], np.float32)) / scale
+    height, width = image_shape[:2]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    return np.hstack([boxes, scores[kept, None], class_ids[kept, None]]).astype(np.float32)
+
+class ExportedModelBackend(DetectionBackend):
+    """Shared pre- and post-processing for models exported from Ultralytics (`yolo export`).
+
+    Subclasses load the runtime and set `input_size`, `batch` (None when the
+    exported model takes any batch size) and `names`, and implement `_run`.
+    A static export must be run with the imgsz it was exported for, since that
+    setting is part of `model_id`; a smaller last batch is padded to `batch`.
+    """
+
+    input_size = None
+    batch = None
+
+    def _check_input_size(self, size):
+        # A static export only accepts the size it was exported with; silently using it
+        # would record detections under a model_id naming a size that was never applied
+        if size is not None and size != self.imgsz:
+            raise ValueError(f"{self.weights} was exported for {size}px inputs; pass --imgsz {size}")
+        self.input_size = self.imgsz
+
+    def _run_padded(self, blob):
+        # A static batch dimension needs full batches: pad with blank images and drop their outputs
+        missing = self.batch - len(blob)
+        if missing <= 0:
+            return self._run(blob)
+        padding = np.zeros((missing, *blob.shape[1:]), dtype=blob.dtype)
+        return self._run(np.concatenate([blob, padding]))[:len(blob)]
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def _predict(self, images):
+        prepared = [letterbox(img, self.input_size) for img in images]
+        # BGR HWC uint8 -> RGB CHW float in [0, 1]
+        blob = np.stack([canvas for canvas, _, _ in prepared])[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        if self.batch is None:
+            outputs = self._run(blob)
+        else:
+            outputs = np.concatenate([self._run_padded(blob[i:i + self.batch])
+                                      for i in range(0, len(images), self.batch)])
+        return [decode_output(output, self.conf, self.iou, scale, pad, img.shape)
+                for output, img, (_, scale, pad) in zip(outputs, images, prepared)]
+
+# Function to parse the class names Ultralytics stores with exported models
+def parse_names(names):
+    if isinstance(names, str):
+        names = ast.literal_eval(names)
+    return {int(class_id): name for class_id, name in names.items()}
+
+class OnnxRuntimeBackend(ExportedModelBackend):
+    """An exported .onnx model on ONNX Runtime's CPU execution provider."""
+
+    name = 'onnxruntime'
+
+    def _load(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(self.weights, sess_options=options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, size, _ = model_input.shape
+        self.batch = batch if isinstance(batch, int) else None
+        self._check_input_size(size if isinstance(size, int) else None)
+        self.names = parse_names(self.session.get_modelmeta().custom_metadata_map.get('names', '{}'))
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+class OpenVinoBackend(ExportedModelBackend):
+    """An exported OpenVINO model (the `*_openvino_model` directory or its .xml file) on the CPU plugin."""
+
+    name = 'openvino'
+
+    def _load(self):
+        import openvino as ov
+
+        xml_path = self.weights
+        if os.path.isdir(xml_path):
+            xml_path = glob.glob(os.path.join(xml_path, '*.xml'))[0]
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        config = {'INFERENCE_NUM_THREADS': self.threads} if self.threads else {}
+        self.compiled = core.compile_model(model, 'CPU', config)
+        shape = model.input(0).get_partial_shape()
+        self.batch = shape[0].get_length() if shape[0].is_static else None
+        self._check_input_size(shape[2].get_length() if shape[2].is_static else None)
+        metadata_path = os.path.join(os.path.dirname(xml_path), 'metadata.yaml')
+        names = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as file:
+                names = yaml.safe_load(file).get('names', {})
+        self.names = parse_names(names)
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.compiled.output(0)]
+
+# The available backends, by the name passed to --backend
+BACKENDS = {backend.name: backend for backend in (UltralyticsBackend, OnnxRuntimeBackend, OpenVinoBackend)}
+
+# Function to pick the backend matching a weights path
+def backend_for(weights):
+    if weights.endswith('.onnx'):
+        return OnnxRuntimeBackend.name
+    if weights.endswith('.xml') or os.path.isdir(weights):
+        return OpenVinoBackend.name
+    return UltralyticsBackend.name
+
+# Function to build a backend from the detection script's --backend and --weights options
+def create_backend(kind='auto', weights=DEFAULT_WEIGHTS, imgsz=DEFAULT_IMGSZ, conf=DEFAULT_CONF, iou=DEFAULT_IOU,
+                   threads=None):
+    if kind == 'auto':
+        kind = backend_for(weights)
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown detection backend: {kind}")
+    return BACKENDS[kind](weights, imgsz=imgsz, conf=conf, iou=iou, threads=threads)
@@ -0,0 +1,154 @@
+import os
+import logging
+import argparse
+from datetime import datetime
+from scripts.detection.backends import (BACKENDS, DEFAULT_CONF, DEFAULT_IMGSZ, DEFAULT_IOU, DEFAULT_WEIGHTS,
+                                        create_backend)
+from scripts.detection.engine import DetectionEngine, list_images
+from scripts.detection_manifest import DetectionManifest
+from scripts.detection_writer import DetectionWriter
+from scripts.perceptual_hash import PerceptualHashIndex, MAX_DISTANCE
+from app.setups.metrics import REGISTRY, LogSampler, counter
+
+logger = logging.getLogger(__name__)
+
+# Per-image and per-detection logs are sampled at DEBUG; the totals are in the metrics summary
+image_log = LogSampler(logger, every=100)
+
+REUSED_IMAGES = counter('detection_reused_images_total', 'Images given the detections of a near-duplicate')
+SECONDS_SAVED = counter('detection_inference_seconds_saved_total',
+                        'Estimated decode and inference time avoided by reusing detections')
+
+# PostgreSQL configuration
+db_config = {
+    'user': 'postgres',
+    'password': 'password',
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'medical_data_warehouse'
+}
+
+# Function to split pending images into those needing inference and near-duplicates of other images.
+# Returns (to_infer, followers, reused): `followers` maps an image inferred in this run to its
+# near-duplicates, `reused` maps an image to the rows the same model stored for its already
+# processed canonical image.
+def plan_reuse(hashes, manifest, writer, image_folder, image_files, reprocess=False):
+    pending = set(image_files)
+    followers = {}
+    earlier = {}
+    for image_file in image_files:
+        image_path = os.path.normpath(os.path.join(image_folder, image_file))
+        canonical = hashes.add_file(image_path)
+        if canonical is None or canonical == image_path:
+            continue
+        canonical_folder, canonical_file = os.path.split(canonical)
+        if canonical_folder == os.path.normpath(image_folder) and canonical_file in pending:
+            followers.setdefault(canonical_file, []).append(image_file)
+        elif not reprocess and os.path.exists(canonical) and not manifest.pending(canonical_folder, [canonical_file]):
+            # Results stored for another model version are not reused after --reprocess
+            earlier[image_file] = canonical_file
+    stored = writer.fetch(set(earlier.values())) if earlier else {}
+    reused = {image_file: stored.get(canonical_file, []) for image_file, canonical_file in earlier.items()}
+    skipped = set(reused).union(*followers.values())
+    return [f for f in image_files if f not in skipped], followers, reused
+
+# Function to copy the detections of one image to a near-duplicate
+def retarget(rows, image_file):
+    now = datetime.now()
+    return [dict(row, image_name=image_file, detection_time=now) for row in rows]
+
+# Function to process images and detect objects; returns the images processed and detections stored.
+# `backend` defaults to DEFAULT_WEIGHTS on the backend matching them; its model is only loaded
+# when there are images to run it on.
+# With `dedupe`, near-duplicate images (dHash within `max_distance` bits) get the detections
+# of their canonical image instead of being run through the model again.
+def detect_objects(image_folder, output_folder, backend=None, batch_size=8, decode_workers=4, write_workers=2,
+                   reprocess=False, flush_rows=500, flush_interval=5.0, dedupe=True, max_distance=MAX_DISTANCE):
+    if backend is None:
+        backend = create_backend()
+    manifest = DetectionManifest(backend.model_id)
+    all_images = list_images(image_folder)
+    image_files = manifest.pending(image_folder, all_images, reprocess=reprocess)
+    logger.info(f"{len(image_files)} of {len(all_images)} images need detection with {backend.model_id} "
+                f"on {backend.name}")
+
+    # Results reach the database in batches while detection runs, stored under the
+    # model's id; images are marked processed only once their rows are committed
+    writer = DetectionWriter(db_config, model_name=backend.model_id, batch_size=flush_rows, flush_interval=flush_interval,
+                             on_flush=lambda images: manifest.mark_processed(image_folder, images))
+    detector = DetectionEngine(backend, batch_size=batch_size, decode_workers=decode_workers,
+                               write_workers=write_workers)
+
+    to_infer, followers, reused = image_files, {}, {}
+    try:
+        if dedupe:
+            hashes = PerceptualHashIndex(max_distance=max_distance)
+            try:
+                to_infer, followers, reused = plan_reuse(hashes, manifest, writer, image_folder, image_files,
+                                                         reprocess=reprocess)
+            finally:
+                hashes.close()
+            logger.info(f"{len(image_files) - len(to_infer)} near-duplicate images reuse earlier detections")
+        for image_file, rows in reused.items():
+            writer.add(image_file, retarget(rows, image_file))
+        for image_file, rows in detector.run(image_folder, output_folder, image_files=to_infer):
+            image_log.debug("Processed image %s: %s", image_file,
+                            ', '.join(f"{row['class_name']} {row['confidence']:.2f}" for row in rows) or 'no detections')
+            writer.add(image_file, rows)
+            for follower in followers.get(image_file, []):
+                writer.add(follower, retarget(rows, follower))
+    finally:
+        writer.close()
+        manifest.close()
+
+    per_item_ms = detector.timer.per_item_ms()
+    stage_ms = ', '.join(f"{stage}={ms:.1f}ms" for stage, ms in per_item_ms.items())
+    logger.info(f"Per-image stage latency: {stage_ms}")
+    reused_count = len(image_files) - len(to_infer)
+    if reused_count:
+        # Estimated from this run's per-image cost; annotated copies are not written for reused images
+        saved = reused_count * (per_item_ms.get('decode', 0.0) + per_item_ms.get('inference', 0.0)) / 1000
+        REUSED_IMAGES.inc(reused_count)
+        SECONDS_SAVED.inc(saved)
+        logger.info(f"Reused detections for {reused_count} near-duplicate images, saving about {saved:.1f}s of inference")
+    REGISTRY.log_summary(logger)
+    return {'images': writer.images_written, 'detections': writer.rows_written, 'reused': reused_count}
+
+# Argument parser setup
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YOLO object detection")
+    parser.add_argument('--backend', choices=['auto', *BACKENDS], default='auto',
+                        help='Inference backend; auto picks it from the weights (.pt, .onnx, OpenVINO directory)')
+    parser.add_argument('--weights', type=str, default=DEFAULT_WEIGHTS,
+                        help='Model weights: a .pt file, an exported .onnx file or an exported OpenVINO model')
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help='Inference input size in pixels')
+    parser.add_argument('--conf', type=float, default=DEFAULT_CONF, help='Minimum confidence of a detection')
+    parser.add_argument('--iou', type=float, default=DEFAULT_IOU, help='IoU threshold of non-maximum suppression')
+    parser.add_argument('--threads', type=int, default=None, help='Inference threads (default: the runtime\'s own)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Images per inference call')
+    parser.add_argument('--decode-workers', type=int, default=4, help='Threads decoding images')
+    parser.add_argument('--write-workers', type=int, default=2, help='Threads annotating and writing images')
+    parser.add_argument('--reprocess', action='store_true',
+                        help='Run detection on every image again, e.g. after a model change')
+    parser.add_argument('--flush-rows', type=int, default=500, help='Detections per database flush')
+    parser.add_argument('--flush-interval', type=float, default=5.0, help='Maximum seconds between flushes')
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help='Run inference on near-duplicate images instead of reusing earlier detections')
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE,
+                        help='Maximum dHash bit difference for two images to count as near-duplicates')
+    return parser.parse_args(argv)
+
+# Main function to trigger the object detection
+def main(argv=None):
+    args = parse_args(argv)
+    image_folder = 'data/raw/images/'  # Folder containing raw images
+    output_folder = 'data/detected_images/'  # Folder to save images with detections
+    backend = create_backend(args.backend, args.weights, imgsz=args.imgsz, conf=args.conf, iou=args.iou,
+                             threads=args.threads)
+    result = detect_objects(image_folder, output_folder, backend=backend, batch_size=args.batch_size,
+                            decode_workers=args.decode_workers, write_workers=args.write_workers,
+                            reprocess=args.reprocess, flush_rows=args.flush_rows,
+                            flush_interval=args.flush_interval, dedupe=not args.no_dedupe,
+                            max_distance=args.max_distance)
+    logger.info("Object detection completed.")
+    return result
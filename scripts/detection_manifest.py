@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Default location of the processed-image manifest
+DEFAULT_MANIFEST_DB = 'data/state/detection_manifest.sqlite'
+
+create_table_query = """
+CREATE TABLE IF NOT EXISTS processed_images (
+    image_path TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    processed_at TEXT NOT NULL,
+    PRIMARY KEY (image_path, model_name)
+);
+"""
+
+class DetectionManifest:
+    """Remembers which images a model has already been run on.
+
+    An image counts as processed for a model when its path is recorded with
+    the same size and modification time it has now; a replaced or edited
+    file, or a different model, makes it pending again.
+    """
+
+    def __init__(self, model_name, path=DEFAULT_MANIFEST_DB):
+        self.model_name = model_name
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Detection writers mark images from a background thread while the main thread plans;
+        # the lock keeps them from using the shared connection at the same time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute(create_table_query)
+            self.connection.commit()
+
+    @staticmethod
+    def _signature(image_path):
+        stat = os.stat(image_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def pending(self, image_folder, image_files, reprocess=False):
+        """Returns the subset of `image_files` that still needs detection."""
+        if reprocess:
+            return list(image_files)
+        with self.lock:
+            known = {
+                row[0]: (row[1], row[2]) for row in self.connection.execute(
+                    "SELECT image_path, size, mtime_ns FROM processed_images WHERE model_name = ?",
+                    (self.model_name,)
+                )
+            }
+        return [f for f in image_files
+                if known.get(os.path.join(image_folder, f)) != self._signature(os.path.join(image_folder, f))]
+
+    def mark_processed(self, image_folder, image_files):
+        now = datetime.now(timezone.utc).isoformat()
+        rows = []
+        for image_file in image_files:
+            image_path = os.path.join(image_folder, image_file)
+            size, mtime_ns = self._signature(image_path)
+            rows.append((image_path, self.model_name, size, mtime_ns, now))
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO processed_images (image_path, model_name, size, mtime_ns, processed_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,215 @@
+import time
+import queue
+import logging
+import threading
+import psycopg2
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from app.setups.cache import invalidate_shared_cache
+from app.setups.metrics import DB_FLUSH_SECONDS, DB_ROWS_WRITTEN
+from app.setups.pgcopy import csv_buffer
+
+logger = logging.getLogger(__name__)
+
+# Columns of a detection row, in COPY order; the writer appends its own model_name
+DETECTION_COLUMNS = ['image_name', 'class_name', 'confidence', 'x_min', 'y_min', 'x_max', 'y_max', 'detection_time']
+
+# Mirrors app/setups/models.py so the writer also works before the API has created the table
+create_table_query = """
+CREATE TABLE IF NOT EXISTS object_detections (
+    id SERIAL PRIMARY KEY,
+    image_name VARCHAR,
+    class_name VARCHAR,
+    confidence FLOAT,
+    x_min FLOAT,
+    y_min FLOAT,
+    x_max FLOAT,
+    y_max FLOAT,
+    detection_time TIMESTAMP,
+    model_name VARCHAR
+);
+"""
+
+# Tables created before detections were stored per model lack the column
+add_model_column_query = "ALTER TABLE object_detections ADD COLUMN IF NOT EXISTS model_name VARCHAR"
+
+# Errors worth retrying: dropped connections, server restarts, serialization failures
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError,
+                    psycopg2.errors.SerializationFailure, psycopg2.errors.DeadlockDetected)
+
+# Errors from the pool (engine.raw_connection(), pre-ping) arrive wrapped by SQLAlchemy;
+# judge those by the driver error inside, or by the pool having invalidated the connection
+def is_transient(error):
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error.orig, TRANSIENT_ERRORS)
+    return isinstance(error, TRANSIENT_ERRORS)
+
+class DetectionWriter:
+    """Streams detection rows into 'object_detections' from a background thread.
+
+    Rows are queued per image with add(). The writer thread flushes whenever
+    `batch_size` rows are waiting or `flush_interval` seconds have passed,
+    COPYing the batch over a pooled connection, tagged with `model_name`, and
+    replacing any earlier rows of the same images and model in the same
+    transaction; rows stored by other models are kept. The queue holds at most
+    `max_pending` images, so add() blocks - and inference pauses - when the
+    database falls behind. Transient errors are retried with backoff; a
+    permanent failure is re-raised from the next add() or close().
+    After each committed batch the shared API read cache is invalidated and
+    `on_flush(image_names)` runs; errors in either are logged, not raised.
+    """
+
+    def __init__(self, db_config, model_name=None, batch_size=500, flush_interval=5.0, max_pending=256,
+                 max_retries=5, on_flush=None):
+        self.engine = create_engine(
+            f'postgresql+psycopg2://{db_config["user"]}:{db_config["password"]}@{db_config["host"]}:{db_config["port"]}/{db_config["database"]}',
+            pool_size=1, max_overflow=0, pool_pre_ping=True
+        )
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.on_flush = on_flush
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.rows_written = 0
+        self.images_written = 0
+        self.flushes = 0
+        self._create_table()
+        self.thread = threading.Thread(target=self._run, name='detection-writer', daemon=True)
+        self.thread.start()
+
+    def _create_table(self):
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(create_table_query)
+                cursor.execute(add_model_column_query)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def add(self, image_name, rows):
+        """Queues the detections of one image (possibly none); blocks while the queue is full."""
+        self._raise_if_failed()
+        self.queue.put((image_name, rows))
+
+    def fetch(self, image_names):
+        """Returns the detection rows this writer's model stored for `image_names` as {image_name: [row, ...]}."""
+        found = {}
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {', '.join(DETECTION_COLUMNS)} FROM object_detections "
+                               f"WHERE image_name = ANY(%s) AND model_name IS NOT DISTINCT FROM %s",
+                               (list(image_names), self.model_name))
+                for values in cursor.fetchall():
+                    row = dict(zip(DETECTION_COLUMNS, values))
+                    found.setdefault(row['image_name'], []).append(row)
+            connection.commit()
+        finally:
+            connection.close()
+        return found
+
+    def close(self):
+        """Flushes everything queued, stops the writer thread and disposes of the pool."""
+        self.queue.put(None)
+        self.thread.join()
+        self.engine.dispose()
+        self._raise_if_failed()
+        logger.info(f"Detection writer stored {self.rows_written} rows for {self.images_written} images "
+                    f"in {self.flushes} flushes.")
+
+    def _raise_if_failed(self):
+        if self.error is not None:
+            raise RuntimeError("Detection writer failed") from self.error
+
+    def _run(self):
+        images = []
+        rows = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item:
+                images.append(item[0])
+                rows.extend(item[1])
+            due = item is None or len(rows) >= self.batch_size or \
+                time.monotonic() - last_flush >= self.flush_interval
+            if due:
+                if images:
+                    try:
+                        self._flush_with_retry(images, rows)
+                    except Exception as e:
+                        logger.error(f"Giving up storing detections for {len(images)} images: {e}")
+                        self.error = e
+                        self._drain()
+                        return
+                    images, rows = [], []
+                last_flush = time.monotonic()
+            if item is None:
+                return
+
+    def _drain(self):
+        # Unblock producers waiting on a full queue; they will see self.error on their next add()
+        while True:
+            try:
+                if self.queue.get_nowait() is None:
+                    return
+            except queue.Empty:
+                return
+
+    def _flush_with_retry(self, images, rows):
+        attempt = 0
+        while True:
+            try:
+                with DB_FLUSH_SECONDS.time(writer='detections'):
+                    self._flush(images, rows)
+                break
+            except Exception as e:
+                if not is_transient(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt)
+                attempt += 1
+                logger.warning(f"Transient error storing detections ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+        self.rows_written += len(rows)
+        self.images_written += len(images)
+        self.flushes += 1
+        DB_ROWS_WRITTEN.inc(len(rows), writer='detections')
+        logger.info(f"Stored {len(rows)} detection records for {len(images)} images to the database.")
+        try:
+            invalidate_shared_cache()
+        except Exception as e:
+            # Cached API reads then stay stale until their TTL expires; not worth failing the run
+            logger.warning(f"Could not invalidate the API cache: {e}")
+        if self.on_flush is not None:
+            try:
+                self.on_flush(images)
+            except Exception:
+                # The rows are committed, so this is not a database failure and must not stop the
+                # writer; images left unmarked are detected again on the next run and replaced
+                logger.exception(f"on_flush failed after storing detections for {len(images)} images")
+
+    def _flush(self, images, rows):
+        buffer = csv_buffer([row[column] for column in DETECTION_COLUMNS] + [self.model_name] for row in rows)
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                # Drop results of earlier runs of this model so reprocessed images are not duplicated
+                cursor.execute("DELETE FROM object_detections "
+                               "WHERE image_name = ANY(%s) AND model_name IS NOT DISTINCT FROM %s",
+                               (images, self.model_name))
+                cursor.copy_expert(
+                    f"COPY object_detections ({', '.join(DETECTION_COLUMNS)}, model_name) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
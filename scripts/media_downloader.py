@@ -0,0 +1,254 @@
+import os
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from telethon.errors import FloodWaitError
+from app.setups.metrics import SIZE_BUCKETS, LogSampler, counter, histogram
+from scripts.checkpoints import message_key, split_message_key
+from scripts.perceptual_hash import dhash_bytes
+
+logger = logging.getLogger(__name__)
+
+download_log = LogSampler(logger, every=50)
+
+DOWNLOADS = counter('media_downloads_total', 'Photo downloads by outcome', ['result'])
+DOWNLOAD_BYTES = counter('media_download_bytes_total', 'Bytes of photos downloaded and stored')
+DOWNLOAD_SECONDS = histogram('media_download_seconds', 'Time to fetch one photo from Telegram')
+DOWNLOAD_SIZE = histogram('media_download_size_bytes', 'Size of downloaded photos', buckets=SIZE_BUCKETS)
+
+# Default location of the content-hash index of downloaded media
+DEFAULT_MEDIA_INDEX_DB = 'data/state/media_index.sqlite'
+
+# Failed downloads are retried on later runs up to this many attempts in total
+MAX_DOWNLOAD_ATTEMPTS = 5
+
+create_table_queries = [
+    """
+    CREATE TABLE IF NOT EXISTS media_hashes (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL
+    );
+    """,
+    # Photo jobs not yet stored: queued, in flight or failed. The scraper's checkpoint moves
+    # past a message as soon as its row is written, so this table is what brings its photo
+    # back on the next run after a failure or a crash.
+    """
+    CREATE TABLE IF NOT EXISTS pending_downloads (
+        name TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        updated_at TEXT NOT NULL
+    );
+    """,
+]
+
+# Function to write a file so readers never observe a partial download
+def write_atomic(path, data):
+    temp_path = f"{path}.part"
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# Function to store `data` at `path` as a hard link to `existing`, a file with the same content,
+# falling back to writing the bytes when it cannot be linked (missing, or on another filesystem)
+def link_or_write(existing, path, data):
+    temp_path = f"{path}.part"
+    try:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        os.link(existing, temp_path)
+        os.replace(temp_path, path)
+        return True
+    except OSError:
+        write_atomic(path, data)
+        return False
+
+class MediaDownloadPool:
+    """Downloads message photos on a fixed number of worker tasks.
+
+    Jobs are queued with submit(), which waits when the queue is full so a slow
+    download side throttles the scrape instead of buffering without bound. A
+    job is skipped when the target file for its message already exists. When the
+    downloaded bytes match an image already stored under another name, the
+    message's file is a hard link to it, so every photo message still has its
+    `{name}.jpg` for detection and the per-channel counts.
+    Every queued job is recorded in `pending_downloads` until its photo is
+    stored, so retry_pending() can fetch the photos of failed or interrupted
+    jobs on the next run. With a PerceptualHashIndex as `hashes`, every stored photo is also indexed
+    by dHash, so that detection can reuse the results of an earlier near-identical
+    photo (a repost that was re-encoded or resized).
+    """
+
+    def __init__(self, output_dir='data/raw/images', parallelism=4, queue_size=None,
+                 index_path=DEFAULT_MEDIA_INDEX_DB, hashes=None):
+        self.output_dir = output_dir
+        self.parallelism = max(1, parallelism)
+        self.queue = asyncio.Queue(maxsize=queue_size or self.parallelism * 4)
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        self.index = sqlite3.connect(index_path)
+        for query in create_table_queries:
+            self.index.execute(query)
+        self.index.commit()
+        self.hashes = hashes
+        self.workers = []
+        self.downloaded = 0
+        self.skipped_existing = 0
+        self.skipped_duplicate = 0
+        self.failed = 0
+        self.near_duplicates = 0
+        self.bytes_downloaded = 0
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.parallelism)]
+        return self
+
+    async def submit(self, message, name):
+        """Queues the photo of `message` to be stored as `{name}.jpg`."""
+        path = os.path.join(self.output_dir, f"{name}.jpg")
+        if os.path.exists(path):
+            self._done(name)
+            self.skipped_existing += 1
+            DOWNLOADS.inc(result='existing')
+            return
+        self.index.execute(
+            "INSERT OR IGNORE INTO pending_downloads (name, path, updated_at) VALUES (?, ?, datetime('now'))",
+            (name, path)
+        )
+        self.index.commit()
+        await self.queue.put((message, name, path))
+
+    async def retry_pending(self, client, max_attempts=MAX_DOWNLOAD_ATTEMPTS):
+        """Queues the photos of jobs left failed or unfinished by earlier runs; returns how many were queued."""
+        rows = self.index.execute(
+            "SELECT name FROM pending_downloads WHERE attempts < ? ORDER BY name", (max_attempts,)
+        ).fetchall()
+        by_channel = {}
+        for (name,) in rows:
+            channel, telegram_id = split_message_key(name)
+            by_channel.setdefault(channel, []).append(telegram_id)
+        queued = 0
+        for channel, ids in by_channel.items():
+            try:
+                messages = await client.get_messages(channel, ids=ids)
+            except Exception as e:
+                logger.warning(f"Could not fetch {len(ids)} pending photo messages from {channel}: {e}")
+                continue
+            for telegram_id, message in zip(ids, messages):
+                name = message_key(channel, telegram_id)
+                if message is None or not message.photo:
+                    # Deleted since, or no longer carrying a photo
+                    self._done(name)
+                    continue
+                await self.submit(message, name)
+                queued += 1
+        if queued:
+            logger.info(f"Retrying {queued} photo downloads left pending by earlier runs")
+        return queued
+
+    def _done(self, name):
+        self.index.execute("DELETE FROM pending_downloads WHERE name = ?", (name,))
+        self.index.commit()
+
+    def _failed(self, name, error):
+        self.index.execute(
+            "UPDATE pending_downloads SET attempts = attempts + 1, error = ?, updated_at = datetime('now') "
+            "WHERE name = ?", (error, name)
+        )
+        self.index.commit()
+
+    async def close(self):
+        """Waits for queued downloads to finish and stops the workers."""
+        for _ in self.workers:
+            await self.queue.put(None)
+        await asyncio.gather(*self.workers)
+        self.index.close()
+        logger.info(
+            f"Media downloads: {self.downloaded} saved ({self.bytes_downloaded} bytes), "
+            f"{self.skipped_existing} already on disk, {self.skipped_duplicate} duplicate content (linked), "
+            f"{self.near_duplicates} near-duplicates of earlier photos, {self.failed} failed"
+        )
+
+    def _claim_hash(self, digest, path):
+        """Records `path` as the file of `digest` unless one is known; returns the path stored first, or None.
+
+        A single INSERT claims the digest, so of several workers fetching the same bytes exactly one writes them.
+        """
+        claimed = self.index.execute(
+            "INSERT OR IGNORE INTO media_hashes (sha256, path) VALUES (?, ?)", (digest, path)
+        ).rowcount
+        self.index.commit()
+        if claimed:
+            return None
+        return self.index.execute("SELECT path FROM media_hashes WHERE sha256 = ?", (digest,)).fetchone()[0]
+
+    def _release_hash(self, digest, path):
+        self.index.execute("DELETE FROM media_hashes WHERE sha256 = ? AND path = ?", (digest, path))
+        self.index.commit()
+
+    async def _download(self, message, path):
+        while True:
+            try:
+                return await message.download_media(file=bytes)
+            except FloodWaitError as e:
+                logger.warning(f"Flood wait of {e.seconds}s while downloading {path}")
+                await asyncio.sleep(e.seconds)
+
+    async def _index_hash(self, path, data):
+        try:
+            value = await asyncio.to_thread(dhash_bytes, data)
+            if value is None:
+                return
+            canonical = self.hashes.add(path, value)
+        except Exception as e:
+            # Detection indexes the file itself later; the download still counts
+            logger.warning(f"Could not hash {path}: {e}")
+            return
+        if canonical != os.path.normpath(path):
+            self.near_duplicates += 1
+            DOWNLOADS.inc(result='near_duplicate')
+            download_log.debug("%s is a near-duplicate of %s", path, canonical)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                return
+            message, name, path = job
+            claimed = None
+            try:
+                with DOWNLOAD_SECONDS.time():
+                    data = await self._download(message, path)
+                DOWNLOAD_SIZE.observe(len(data))
+                digest = hashlib.sha256(data).hexdigest()
+                existing = self._claim_hash(digest, path)
+                if existing:
+                    # The file of the first message with these bytes may still be in flight; then the bytes are written
+                    await asyncio.to_thread(link_or_write, existing, path, data)
+                    self._done(name)
+                    self.skipped_duplicate += 1
+                    DOWNLOADS.inc(result='duplicate')
+                    download_log.debug("Linked %s: same content as %s", path, existing)
+                else:
+                    claimed = digest
+                    await asyncio.to_thread(write_atomic, path, data)
+                    self._done(name)
+                    self.downloaded += 1
+                    self.bytes_downloaded += len(data)
+                    DOWNLOADS.inc(result='downloaded')
+                    DOWNLOAD_BYTES.inc(len(data))
+                    download_log.debug("Downloaded image: %s", path)
+                if self.hashes is not None:
+                    await self._index_hash(path, data)
+            except Exception as e:
+                if claimed is not None and not os.path.exists(path):
+                    # Let a later copy of these bytes be stored in full
+                    self._release_hash(claimed, path)
+                self._failed(name, repr(e))
+                self.failed += 1
+                DOWNLOADS.inc(result='failed')
+                logger.error(f"Error downloading media to {path}: {e}")
@@ -0,0 +1,122 @@
+import os
+import csv
+import time
+import logging
+import psycopg2
+from app.setups.metrics import DB_FLUSH_SECONDS, DB_ROWS_WRITTEN
+from app.setups.pgcopy import csv_buffer
+
+logger = logging.getLogger(__name__)
+
+# Columns written for every scraped message, in order
+MESSAGE_FIELDS = ['message_id', 'sender_id', 'message_text', 'channel', 'date']
+
+# Sinks receive scraped messages in bounded batches through write_batch() and
+# must make each batch durable before returning, so that a crash only loses
+# the batch in flight. close() flushes and releases whatever the sink holds.
+
+class CsvSink:
+    """Appends batches to a CSV file, writing the header only when the file is new."""
+
+    def __init__(self, filepath='data/raw/messages.csv'):
+        self.filepath = filepath
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        write_header = not os.path.exists(filepath) or os.path.getsize(filepath) == 0
+        self.file = open(filepath, mode='a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=MESSAGE_FIELDS)
+        if write_header:
+            self.writer.writeheader()
+
+    def write_batch(self, messages):
+        self.writer.writerows(messages)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    """Appends each batch to the partitioned Parquet message dataset (see scripts/parquet_store.py).
+
+    Every batch is written as its own files (one per channel and day), so it is
+    durable when write_batch returns. To keep long scrapes from leaving
+    thousands of tiny files, a partition is compacted into one file once this
+    sink has written `compact_files` files to it, and every partition it wrote
+    to is compacted on close.
+    """
+
+    def __init__(self, base_dir='data/raw/messages', compact_files=32):
+        from scripts import parquet_store
+
+        self.store = parquet_store
+        self.base_dir = base_dir
+        self.compact_files = max(2, compact_files)
+        # Files written per partition directory since it was last compacted
+        self.files = {}
+        os.makedirs(base_dir, exist_ok=True)
+
+    def write_batch(self, messages):
+        for path in self.store.write_messages(self.store.messages_table(messages), self.base_dir):
+            partition_dir = os.path.dirname(path)
+            self.files[partition_dir] = self.files.get(partition_dir, 0) + 1
+            if self.files[partition_dir] >= self.compact_files:
+                self.store.compact_partition(partition_dir)
+                self.files[partition_dir] = 1
+
+    def close(self):
+        for partition_dir, written in self.files.items():
+            if written > 1:
+                self.store.compact_partition(partition_dir)
+        self.files = {}
+
+class PostgresCopySink:
+    """Streams batches into the medical_data table with COPY.
+
+    Each batch is copied into a temporary staging table and merged with
+    ON CONFLICT DO NOTHING, so re-scraped messages never abort the load.
+    """
+
+    def __init__(self, db_config, table='medical_data'):
+        self.table = table
+        self.connection = psycopg2.connect(
+            user=db_config['user'],
+            password=db_config['password'],
+            host=db_config['host'],
+            port=db_config['port'],
+            database=db_config['database']
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE message_staging (LIKE {table} INCLUDING DEFAULTS)")
+        self.connection.commit()
+
+    def write_batch(self, messages):
+        buffer = csv_buffer([message.get(field) for field in MESSAGE_FIELDS] for message in messages)
+        columns = ', '.join(MESSAGE_FIELDS)
+        start = time.perf_counter()
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY message_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cursor.execute(
+                    f"INSERT INTO {self.table} ({columns}) SELECT {columns} FROM message_staging "
+                    f"ON CONFLICT (message_id) DO NOTHING"
+                )
+                cursor.execute("TRUNCATE message_staging")
+            self.connection.commit()
+            DB_FLUSH_SECONDS.observe(time.perf_counter() - start, writer='messages')
+            DB_ROWS_WRITTEN.inc(len(messages), writer='messages')
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+# Function to build a sink from the scraper's --sink option
+def create_sink(kind, output=None, db_config=None):
+    if kind == 'csv':
+        return CsvSink(output or 'data/raw/messages.csv')
+    if kind == 'parquet':
+        return ParquetSink(output or 'data/raw/messages')
+    if kind == 'postgres':
+        return PostgresCopySink(db_config)
+    raise ValueError(f"Unknown sink: {kind}")
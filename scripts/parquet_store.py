@@ -0,0 +1,141 @@
+import os
+import uuid
+import shutil
+from datetime import date
+from urllib.parse import unquote
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Default locations of the raw and cleaned message datasets
+DEFAULT_RAW_DATASET = 'data/raw/messages'
+DEFAULT_CLEANED_DATASET = 'data/cleaned/messages'
+
+# Columns of a message, in order; sender_id is kept as text like in 'medical_data'
+MESSAGE_SCHEMA = pa.schema([
+    ('message_id', pa.string()),
+    ('sender_id', pa.string()),
+    ('message_text', pa.string()),
+    ('channel', pa.string()),
+    ('date', pa.timestamp('us', tz='UTC')),
+])
+
+# Hive-style directory layout: {base}/channel=<name>/message_date=<YYYY-MM-DD>/part-*.parquet
+PARTITION_SCHEMA = pa.schema([
+    ('channel', pa.string()),
+    ('message_date', pa.date32()),
+])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+
+# Upper bound on channel/day partitions touched by one write (pyarrow defaults to 1024)
+MAX_PARTITIONS_PER_WRITE = 100000
+
+# Schema seen when reading: the message columns plus the derived partition date
+DATASET_SCHEMA = MESSAGE_SCHEMA.append(pa.field('message_date', pa.date32()))
+
+# Message datasets are stored as partitioned Parquet so every stage exchanges typed
+# columns instead of re-parsing CSV, and readers can prune whole channels or days
+# from the directory names alone, without opening the files.
+
+def messages_table(messages):
+    """Builds a table in MESSAGE_SCHEMA from scraped message dicts."""
+    return pa.Table.from_pylist(
+        [dict(message, sender_id=None if message['sender_id'] is None else str(message['sender_id']))
+         for message in messages],
+        schema=MESSAGE_SCHEMA,
+    )
+
+def write_messages(table, base_dir):
+    """Appends a table in MESSAGE_SCHEMA to the dataset under `base_dir`; returns the paths written.
+
+    Every call writes new files (one per channel and day present in the table),
+    so appends never overwrite earlier data; writers that rewrite a selection
+    call clear_partitions first.
+    """
+    paths = []
+    table = table.select(MESSAGE_SCHEMA.names).cast(MESSAGE_SCHEMA)
+    # The UTC calendar day of each message; partitions are cut on it
+    table = table.append_column('message_date', table['date'].cast(pa.date32()))
+    ds.write_dataset(
+        table, base_dir, format='parquet', partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        # A backfill chunk can span every channel and many days
+        max_partitions=MAX_PARTITIONS_PER_WRITE,
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        file_visitor=lambda written: paths.append(written.path),
+    )
+    return paths
+
+def compact_partition(partition_dir):
+    """Rewrites the Parquet files of one partition directory as a single file; returns how many it replaced.
+
+    The new file is written under a hidden name (readers skip files starting
+    with '.') and renamed into place before the old files are removed, so a
+    crash part-way leaves duplicate rows, which every reader already merges on
+    message_id, but never loses any.
+    """
+    files = sorted(f for f in os.listdir(partition_dir) if f.endswith('.parquet') and not f.startswith(('.', '_')))
+    if len(files) < 2:
+        return 0
+    table = pa.concat_tables([pq.ParquetFile(os.path.join(partition_dir, f)).read() for f in files])
+    name = f"part-{uuid.uuid4().hex}-0.parquet"
+    temp_path = os.path.join(partition_dir, '.' + name)
+    pq.write_table(table, temp_path, compression='zstd')
+    os.replace(temp_path, os.path.join(partition_dir, name))
+    for f in files:
+        os.remove(os.path.join(partition_dir, f))
+    return len(files)
+
+def open_dataset(base_dir):
+    return ds.dataset(base_dir, format='parquet', partitioning=PARTITIONING, schema=DATASET_SCHEMA)
+
+def partition_filter(channels=None, since=None, until=None):
+    """Expression selecting partitions by channel names and a [since, until) date range."""
+    conditions = []
+    if channels:
+        conditions.append(ds.field('channel').isin(list(channels)))
+    if since is not None:
+        conditions.append(ds.field('message_date') >= pa.scalar(since, pa.date32()))
+    if until is not None:
+        conditions.append(ds.field('message_date') < pa.scalar(until, pa.date32()))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def iter_message_batches(base_dir, channels=None, since=None, until=None, batch_size=100000):
+    """Yields record batches of the message columns from the selected partitions only."""
+    dataset = open_dataset(base_dir)
+    yield from dataset.to_batches(columns=MESSAGE_SCHEMA.names, batch_size=batch_size,
+                                  filter=partition_filter(channels, since, until))
+
+def clear_partitions(base_dir, channels=None, since=None, until=None):
+    """Deletes the partition directories partition_filter would select; returns how many were removed.
+
+    Writers call this before rewriting a selection, which makes re-running a
+    stage for the same channels and days idempotent.
+    """
+    removed = 0
+    if not os.path.isdir(base_dir):
+        return removed
+    for channel_dir in os.listdir(base_dir):
+        key, _, channel = channel_dir.partition('=')
+        if key != 'channel' or (channels and unquote(channel) not in channels):
+            continue
+        for date_dir in os.listdir(os.path.join(base_dir, channel_dir)):
+            key, _, value = date_dir.partition('=')
+            if key != 'message_date':
+                continue
+            try:
+                day = date.fromisoformat(unquote(value))
+            except ValueError:
+                # Messages without a date; only a selection without a date range includes them
+                day = None
+            if (since is not None or until is not None) and day is None:
+                continue
+            if (since is not None and day < since) or (until is not None and day >= until):
+                continue
+            shutil.rmtree(os.path.join(base_dir, channel_dir, date_dir))
+            removed += 1
+    return removed
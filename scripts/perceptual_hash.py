@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+import cv2
+import numpy as np
+
+# Default location of the perceptual-hash index
+DEFAULT_PHASH_DB = 'data/state/image_hashes.sqlite'
+
+# Images whose 64-bit dHashes differ in at most this many bits are treated as the same photo.
+# The index splits each hash into 4 bands of 16 bits: two hashes within 3 bits of each other
+# must agree exactly on at least one band, so band lookups find every match.
+MAX_DISTANCE = 3
+BANDS = 4
+
+create_table_queries = [
+    """
+    CREATE TABLE IF NOT EXISTS image_hashes (
+        path TEXT PRIMARY KEY,
+        hash INTEGER NOT NULL,
+        band0 INTEGER NOT NULL,
+        band1 INTEGER NOT NULL,
+        band2 INTEGER NOT NULL,
+        band3 INTEGER NOT NULL,
+        canonical TEXT NOT NULL
+    );
+    """,
+    *(f"CREATE INDEX IF NOT EXISTS ix_image_hashes_band{i} ON image_hashes (band{i});" for i in range(BANDS)),
+]
+
+def dhash(gray):
+    """64-bit difference hash of a grayscale image: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def dhash_file(image_path):
+    # A reduced decode is enough for a 9x8 thumbnail and several times faster than a full one
+    gray = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    return None if gray is None else dhash(gray)
+
+def dhash_bytes(data):
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    return None if gray is None else dhash(gray)
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def _bands(value):
+    return [(value >> (16 * i)) & 0xFFFF for i in range(BANDS)]
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class PerceptualHashIndex:
+    """Maps image paths to dHashes and to the canonical image of their near-duplicate group.
+
+    The first image seen of a group is its canonical image. Every later image
+    within `max_distance` bits of a known image joins that image's group, so
+    reposts of the same product photo, re-encoded or resized, share one
+    canonical image whose detections they can reuse.
+    """
+
+    def __init__(self, path=DEFAULT_PHASH_DB, max_distance=MAX_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for band lookups to find every match")
+        self.max_distance = max_distance
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        for query in create_table_queries:
+            self.connection.execute(query)
+        self.connection.commit()
+
+    def canonical(self, image_path):
+        """The canonical image recorded for `image_path`, or None if it was never indexed."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT canonical FROM image_hashes WHERE path = ?", (os.path.normpath(image_path),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def nearest(self, value):
+        """(path, canonical, distance) of the closest indexed image within max_distance, or None."""
+        bands = _bands(value)
+        with self.lock:
+            candidates = self.connection.execute(
+                "SELECT path, hash, canonical FROM image_hashes "
+                "WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?", bands
+            ).fetchall()
+        best = None
+        for path, stored, canonical in candidates:
+            distance = hamming(value, stored & ((1 << 64) - 1))
+            if distance <= self.max_distance and (best is None or distance < best[2]):
+                best = (path, canonical, distance)
+        return best
+
+    def add(self, image_path, value):
+        """Indexes `image_path` with hash `value` and returns its canonical image path."""
+        image_path = os.path.normpath(image_path)
+        known = self.canonical(image_path)
+        if known is not None:
+            return known
+        match = self.nearest(value)
+        canonical = match[1] if match else image_path
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO image_hashes (path, hash, band0, band1, band2, band3, canonical) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (image_path, _to_signed(value), *_bands(value), canonical)
+            )
+            self.connection.commit()
+        return canonical
+
+    def add_file(self, image_path):
+        """Indexes an image file unless it already is; returns its canonical path (None if unreadable)."""
+        known = self.canonical(image_path)
+        if known is not None:
+            return known
+        value = dhash_file(image_path)
+        return None if value is None else self.add(image_path, value)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,314 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from scripts import telegram_scraper
+from scripts.clean_messages import clean_file
+from scripts.db_loader import db_config, connect_to_db, create_table, load_dataset_to_table, close_connection
+from scripts.parquet_store import DEFAULT_CLEANED_DATASET, DEFAULT_RAW_DATASET
+from app.setups.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Default location of the run table
+DEFAULT_PIPELINE_DB = 'data/state/pipeline.sqlite'
+
+# dbt project run by the dbt stage
+DBT_PROJECT_DIR = 'medical_data_warehouse'
+
+# Days before the last successful clean that are cleaned and loaded again, for late messages
+DEFAULT_LOOKBACK_DAYS = 1
+
+create_table_queries = [
+    """
+    CREATE TABLE IF NOT EXISTS pipeline_runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        status TEXT NOT NULL,
+        since TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pipeline_stages (
+        run_id INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        attempt INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        seconds REAL,
+        rows INTEGER,
+        rows_per_second REAL,
+        error TEXT,
+        PRIMARY KEY (run_id, stage, attempt)
+    );
+    """,
+]
+
+def utcnow():
+    return datetime.now(timezone.utc).isoformat()
+
+class RunStore:
+    """Records pipeline runs and every stage attempt with its wall time, rows and throughput."""
+
+    def __init__(self, path=DEFAULT_PIPELINE_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Stages record their attempts from worker threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        for query in create_table_queries:
+            self.connection.execute(query)
+        self.connection.commit()
+
+    def _execute(self, query, params=()):
+        with self.lock:
+            cursor = self.connection.execute(query, params)
+            rows = cursor.fetchall()
+            self.connection.commit()
+            return cursor, rows
+
+    def start_run(self, since):
+        cursor, _ = self._execute(
+            "INSERT INTO pipeline_runs (started_at, status, since) VALUES (?, 'running', ?)",
+            (utcnow(), since.isoformat() if since else None)
+        )
+        return cursor.lastrowid
+
+    def resumable_run(self):
+        """Returns (run_id, since) of the latest run that did not succeed, or None."""
+        _, rows = self._execute("SELECT run_id, status, since FROM pipeline_runs ORDER BY run_id DESC LIMIT 1")
+        if not rows or rows[0][1] == 'succeeded':
+            return None
+        row = rows[0]
+        self._execute("UPDATE pipeline_runs SET status = 'running', finished_at = NULL WHERE run_id = ?", (row[0],))
+        return row[0], date.fromisoformat(row[2]) if row[2] else None
+
+    def finish_run(self, run_id, status):
+        self._execute("UPDATE pipeline_runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                      (status, utcnow(), run_id))
+
+    def completed_stages(self, run_id):
+        _, rows = self._execute(
+            "SELECT stage FROM pipeline_stages WHERE run_id = ? AND status IN ('succeeded', 'skipped')", (run_id,)
+        )
+        return {row[0] for row in rows}
+
+    def last_success(self, stage):
+        """Start time of the latest successful attempt of `stage`, or None."""
+        _, rows = self._execute(
+            "SELECT max(started_at) FROM pipeline_stages WHERE stage = ? AND status = 'succeeded'", (stage,)
+        )
+        return datetime.fromisoformat(rows[0][0]) if rows and rows[0][0] else None
+
+    def record(self, run_id, stage, attempt, status, started_at, seconds=None, rows=None, error=None):
+        rate = rows / seconds if rows is not None and seconds else None
+        self._execute(
+            "INSERT OR REPLACE INTO pipeline_stages "
+            "(run_id, stage, attempt, status, started_at, seconds, rows, rows_per_second, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, stage, attempt, status, started_at, seconds, rows, rate, error)
+        )
+
+    def next_attempt(self, run_id, stage):
+        """Number of the next attempt of `stage` in a run, so a resumed run keeps earlier attempts."""
+        _, rows = self._execute(
+            "SELECT coalesce(max(attempt), 0) FROM pipeline_stages WHERE run_id = ? AND stage = ?", (run_id, stage)
+        )
+        return rows[0][0] + 1
+
+    def attempts(self, run_id):
+        """(stage, attempt, status, seconds, rows, rows_per_second) of every attempt in a run."""
+        _, rows = self._execute(
+            "SELECT stage, attempt, status, seconds, rows, rows_per_second FROM pipeline_stages "
+            "WHERE run_id = ? AND attempt > 0 ORDER BY started_at", (run_id,)
+        )
+        return rows
+
+    def close(self):
+        self.connection.close()
+
+# Stage functions take the parsed options and return the rows they processed (or None).
+# Each one is safe to re-run: the scraper resumes from its checkpoints, the cleaner
+# replaces the partitions it writes, the loader merges on message_id, dbt models are
+# incremental and detection skips images already in its manifest.
+
+def scrape_stage(options):
+    # Messages go to the dataset the clean stage reads
+    argv = ['--sink', 'parquet', '--output', options.raw_dataset]
+    if options.batch_file:
+        argv += ['--batch-file', options.batch_file]
+    for channel in options.telegram_channel or []:
+        argv += ['--telegram-channel', channel]
+    args = telegram_scraper.parse_args(argv)
+    # Stages run on worker threads, which have no event loop for the client; each attempt gets its own
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        client = telegram_scraper.TelegramClient('session_name', telegram_scraper.api_id, telegram_scraper.api_hash)
+        with client:
+            return client.loop.run_until_complete(telegram_scraper.main(client, args))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+def clean_stage(options):
+    stats = clean_file(options.raw_dataset, options.cleaned_dataset, workers=options.clean_workers,
+                       since=options.since)
+    return stats['rows_written']
+
+def load_stage(options):
+    connection = connect_to_db(db_config)
+    try:
+        create_table(connection)
+        return load_dataset_to_table(options.cleaned_dataset, connection, since=options.since)['rows_read']
+    finally:
+        close_connection(connection)
+
+def dbt_stage(options):
+    subprocess.run(['dbt', 'run', '--profiles-dir', '.'], cwd=DBT_PROJECT_DIR, check=True)
+    return None
+
+def detect_stage(options):
+    # Imported here so the other stages do not need the detection dependencies
+    from scripts.detection.core import detect_objects
+
+    return detect_objects('data/raw/images/', 'data/detected_images/')['images']
+
+class Stage:
+    def __init__(self, name, run, after=()):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+
+# The pipeline DAG: detection only needs the scraped images, so it runs alongside
+# the clean -> load -> dbt chain
+STAGES = [
+    Stage('scrape', scrape_stage),
+    Stage('clean', clean_stage, after=['scrape']),
+    Stage('load', load_stage, after=['clean']),
+    Stage('dbt', dbt_stage, after=['load']),
+    Stage('detect', detect_stage, after=['scrape']),
+]
+
+def run_stage(stage, options, store, run_id, retries=2, retry_delay=30.0):
+    """Runs one stage with retries, recording every attempt; returns 'succeeded' or 'failed'."""
+    first = store.next_attempt(run_id, stage.name)
+    for attempt in range(first, first + retries + 1):
+        started_at = utcnow()
+        start = time.perf_counter()
+        logger.info(f"Stage {stage.name} started (attempt {attempt})")
+        try:
+            rows = stage.run(options)
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            store.record(run_id, stage.name, attempt, 'failed', started_at, seconds, error=repr(e))
+            logger.exception(f"Stage {stage.name} failed after {seconds:.1f}s (attempt {attempt})")
+            if attempt >= first + retries:
+                return 'failed'
+            time.sleep(retry_delay * 2 ** (attempt - first))
+            continue
+        seconds = time.perf_counter() - start
+        store.record(run_id, stage.name, attempt, 'succeeded', started_at, seconds, rows)
+        rate = f", {rows / seconds:.0f} rows/s" if rows is not None and seconds else ''
+        logger.info(f"Stage {stage.name} succeeded in {seconds:.1f}s ({rows} rows{rate})")
+        return 'succeeded'
+
+def run_pipeline(stages, options, store, run_id, completed=(), skip=(), retries=2, retry_delay=30.0):
+    """Runs `stages` as a DAG: each stage starts as soon as everything it comes after has finished.
+
+    Stages in `completed` (from a resumed run) and in `skip` count as done;
+    stages after a failed one are recorded as blocked. Returns a dict of
+    stage name to final status.
+    """
+    status = {name: 'succeeded' for name in completed}
+    pending = {stage.name: stage for stage in stages if stage.name not in status}
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name, stage in list(pending.items()):
+                    if name in skip:
+                        status[name] = 'skipped'
+                    elif any(status.get(dep) in ('failed', 'blocked') for dep in stage.after):
+                        status[name] = 'blocked'
+                    elif all(status.get(dep) in ('succeeded', 'skipped') for dep in stage.after):
+                        running[pool.submit(run_stage, stage, options, store, run_id, retries, retry_delay)] = name
+                    else:
+                        continue
+                    if status.get(name) in ('skipped', 'blocked'):
+                        store.record(run_id, name, 0, status[name], utcnow())
+                    del pending[name]
+                    changed = True
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                status[running.pop(future)] = future.result()
+    return status
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the scrape, clean, load, dbt and detection stages")
+    parser.add_argument('--telegram-channel', action='append', help='Channel to scrape (repeatable)')
+    parser.add_argument('--batch-file', type=str, help='File with one channel per line')
+    parser.add_argument('--skip', action='append', default=[], choices=[stage.name for stage in STAGES],
+                        help='Stage to leave out (repeatable); stages after it still run')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the latest unfinished run, skipping its completed stages')
+    parser.add_argument('--since', type=date.fromisoformat,
+                        help='First message date to clean and load (default: the last successful clean, '
+                             f'minus {DEFAULT_LOOKBACK_DAYS} day)')
+    parser.add_argument('--full', action='store_true', help='Clean and load every partition')
+    parser.add_argument('--retries', type=int, default=2, help='Retries per stage')
+    parser.add_argument('--retry-delay', type=float, default=30.0, help='Seconds before the first retry')
+    parser.add_argument('--clean-workers', type=int, default=None, help='Worker processes for cleaning')
+    parser.add_argument('--raw-dataset', type=str, default=DEFAULT_RAW_DATASET)
+    parser.add_argument('--cleaned-dataset', type=str, default=DEFAULT_CLEANED_DATASET)
+    parser.add_argument('--run-db', type=str, default=DEFAULT_PIPELINE_DB, help='SQLite file holding the run table')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    options = parse_args(argv)
+    store = RunStore(options.run_db)
+    try:
+        resumed = store.resumable_run() if options.resume else None
+        if resumed:
+            run_id, options.since = resumed
+            completed = store.completed_stages(run_id)
+            logger.info(f"Resuming run {run_id}; already completed: {sorted(completed) or 'nothing'}")
+        else:
+            if options.since is None and not options.full:
+                last_clean = store.last_success('clean')
+                if last_clean is not None:
+                    options.since = last_clean.date() - timedelta(days=DEFAULT_LOOKBACK_DAYS)
+            run_id = store.start_run(options.since)
+            completed = set()
+        logger.info(f"Pipeline run {run_id} started (messages since {options.since or 'the beginning'})")
+
+        status = run_pipeline(STAGES, options, store, run_id, completed=completed, skip=set(options.skip),
+                              retries=options.retries, retry_delay=options.retry_delay)
+        succeeded = all(value in ('succeeded', 'skipped') for value in status.values())
+        REGISTRY.log_summary(logger)
+        store.finish_run(run_id, 'succeeded' if succeeded else 'failed')
+
+        print(f"Run {run_id}: " + ', '.join(f"{stage.name}={status[stage.name]}" for stage in STAGES))
+        for stage, attempt, state, seconds, rows, rate in store.attempts(run_id):
+            print(f"  {stage:<8} #{attempt} {state:<10} {seconds or 0:>8.1f}s {rows if rows is not None else '-':>10} rows"
+                  + (f" {rate:>10.0f} rows/s" if rate else ''))
+        return 0 if succeeded else 1
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    # One log for every stage run in this process
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(filename='logs/pipeline.log', level=logging.INFO, force=True,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
@@ -1,12 +1,18 @@
 import os
-import csv
+import asyncio
+import random
 import logging
 import logging.config
 import yaml
 import argparse
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 from dotenv import load_dotenv  # Import dotenv
-import uuid  # Import UUID for generating unique identifiers
+from scripts.message_sinks import create_sink
+from scripts.media_downloader import MediaDownloadPool
+from scripts.perceptual_hash import PerceptualHashIndex
+from scripts.checkpoints import CheckpointStore, DEFAULT_CHECKPOINT_DB, message_key, split_message_key
+from app.setups.metrics import REGISTRY, LogSampler, counter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,20 +28,67 @@ with open('config/logging_config.yaml', 'r') as file:
 
 logger = logging.getLogger(__name__)
 
+# Per-message logs are sampled; totals are in the metrics summary logged at the end
+message_log = LogSampler(logger, every=100)
+
+MESSAGES_SCRAPED = counter('scraper_messages_total', 'Messages scraped', ['channel'])
+
 # Telegram API credentials (from environment variables)
 api_id = os.getenv('API_ID')
 api_hash = os.getenv('API_HASH')
 phone = os.getenv('PHONE_NUMBER')
 
-# Create the Telegram client
-client = TelegramClient('session_name', api_id, api_hash)
+# Number of channels scraped at the same time
+DEFAULT_CONCURRENCY = int(os.getenv('SCRAPER_CONCURRENCY', 8))
+
+# Messages handed to the sink per write
+DEFAULT_BATCH_SIZE = int(os.getenv('SCRAPER_BATCH_SIZE', 1000))
+
+# Seconds a partial batch may wait before it is written anyway
+FLUSH_INTERVAL_SECONDS = 5.0
+
+# PostgreSQL configuration (used by the postgres sink)
+db_config = {
+    'user': 'postgres',
+    'password': 'password',
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'medical_data_warehouse'
+}
+
+# Concurrent photo downloads for image channels
+DEFAULT_DOWNLOAD_PARALLELISM = int(os.getenv('SCRAPER_DOWNLOAD_PARALLELISM', 4))
+
+# Retry policy for errors other than flood waits (network hiccups, timeouts)
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# Channels to collect images from (specific channels)
+image_channels = ['CheMed123', 'lobelia4cosmetics']
 
 # Argument parser setup
-parser = argparse.ArgumentParser(description="Telegram Scraper")
-parser.add_argument('--telegram-channel', type=str, help='Telegram channel to download data from')
-parser.add_argument('--batch-file', type=str, help='File containing a list of Telegram channels')
-parser.add_argument('--min-id', type=int, help='Offset ID for incremental updates')
-args = parser.parse_args()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Telegram Scraper")
+    parser.add_argument('--telegram-channel', action='append',
+                        help='Telegram channel to download data from; repeat for several channels')
+    parser.add_argument('--batch-file', type=str, help='File containing a list of Telegram channels')
+    parser.add_argument('--min-id', type=int, help='Lowest message ID to fetch; stored checkpoints resume above it')
+    parser.add_argument('--checkpoint-db', type=str, default=DEFAULT_CHECKPOINT_DB,
+                        help='SQLite file holding the last message ID scraped per channel')
+    parser.add_argument('--reset-checkpoints', action='store_true',
+                        help='Forget stored checkpoints for the selected channels and re-scrape their history')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Maximum number of channels scraped concurrently')
+    parser.add_argument('--sink', choices=['csv', 'parquet', 'postgres'], default='parquet',
+                        help='Where scraped messages are streamed to')
+    parser.add_argument('--output', type=str,
+                        help='Dataset directory for the parquet sink, or output file for the csv sink')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Messages written to the sink per batch')
+    parser.add_argument('--download-parallelism', type=int, default=DEFAULT_DOWNLOAD_PARALLELISM,
+                        help='Concurrent photo downloads for image channels')
+    return parser.parse_args(argv)
 
 # Function to read channels from batch file
 def read_channels_from_file(filepath):
@@ -44,85 +97,194 @@ def read_channels_from_file(filepath):
     logger.info(f"Loaded {len(channels)} channels from {filepath}")
     return channels
 
-# Determine channels to scrape
-channel_usernames = []
-if args.telegram_channel:
-    channel_usernames = [args.telegram_channel]
-    logger.info(f"Scraping data from single channel: {args.telegram_channel}")
-elif args.batch_file:
-    channel_usernames = read_channels_from_file(args.batch_file)
-    logger.info(f"Scraping data from batch file: {args.batch_file}")
-else:
-    logger.error("No Telegram channel or batch file provided")
-    exit(1)
+# Determine channels to scrape: the --telegram-channel flags followed by the batch file, without repeats
+def resolve_channels(args):
+    channels = list(args.telegram_channel or [])
+    if channels:
+        logger.info(f"Scraping data from channels: {', '.join(channels)}")
+    if args.batch_file:
+        logger.info(f"Scraping data from batch file: {args.batch_file}")
+        channels += read_channels_from_file(args.batch_file)
+    return list(dict.fromkeys(channels))
 
-# Channels to collect images from (specific channels)
-image_channels = ['CheMed123', 'lobelia4cosmetics']
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
 
-async def scrape_telegram_channels(min_id=None):
-    all_messages = []
-    for username in channel_usernames:
-        logger.info(f"Starting to scrape messages from {username} with min_id={min_id}")
+async def iter_channel_messages(client, username, min_id=None, downloads=None):
+    """Yields message rows for one channel, waiting out flood waits and retrying transient errors.
+
+    Messages are read oldest first so that after a flood wait or a dropped
+    connection the scrape resumes from the last message id already seen
+    instead of starting over. With a `downloads` pool, photos are queued for
+    download in the same pass.
+    """
+    last_id = min_id or 0
+    attempt = 0
+    count = 0
+    logger.info(f"Starting to scrape messages from {username} with min_id={min_id}")
+    while True:
         try:
-            async for message in client.iter_messages(username, min_id=min_id or 0):
-                message_id = str(uuid.uuid4())  # Generate a unique identifier
-                all_messages.append({
-                    'message_id': message_id,  # Store the unique identifier
+            async for message in client.iter_messages(username, min_id=last_id, reverse=True):
+                if downloads is not None and message.photo:
+                    await downloads.submit(message, message_key(username, message.id))
+                yield {
+                    'message_id': message_key(username, message.id),  # Stable across re-runs
                     'sender_id': message.sender_id,
                     'message_text': message.text,
                     'channel': username,
                     'date': message.date
-                })
-                logger.info(f"Scraped message from {username}: {message.text[:30]}...")  # Log only part of the message
+                }
+                last_id = message.id
+                attempt = 0
+                count += 1
+                MESSAGES_SCRAPED.inc(channel=username)
+                message_log.debug("Scraped message from %s: %.30s...", username, message.text or '')
+            logger.info(f"Scraped {count} messages from {username}")
+            return
+        except FloodWaitError as e:
+            # Telegram tells us exactly how long to wait; only this channel's task sleeps
+            logger.warning(f"Flood wait of {e.seconds}s while scraping {username}, resuming after id {last_id}")
+            await asyncio.sleep(e.seconds)
+        except (ConnectionError, asyncio.TimeoutError, OSError) as e:
+            if attempt >= MAX_RETRIES:
+                logger.error(f"Giving up on {username} after {attempt} retries: {e}")
+                return
+            delay = backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"Transient error scraping {username} ({e}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
         except Exception as e:
             logger.error(f"Error scraping messages from {username}: {e}")
-    return all_messages
-
-async def scrape_images(min_id=None):
-    for username in image_channels:
-        if username in channel_usernames:
-            logger.info(f"Starting to scrape images from {username} with min_id={min_id}")
-            try:
-                async for message in client.iter_messages(username, min_id=min_id or 0):
-                    if message.photo:
-                        message_id = str(uuid.uuid4())  # Generate a unique identifier for the image
-                        path = await message.download_media(file=f'data/raw/images/{username}_{message_id}.jpg')
-                        logger.info(f"Downloaded image from {username}: {path}")
-            except Exception as e:
-                logger.error(f"Error scraping images from {username}: {e}")
-
-def store_data(messages, filepath='data/raw/messages.csv'):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            return
+
+def batch_positions(batch):
+    """Returns the highest Telegram message id per channel in a written batch."""
+    positions = {}
+    for row in batch:
+        channel, telegram_id = split_message_key(row['message_id'])
+        positions[channel] = max(positions.get(channel, 0), telegram_id)
+    return positions
+
+async def write_batches(queue, sink, batch_size, producers, checkpoints=None):
+    """Drains the queue into the sink in batches of at most `batch_size` rows.
+
+    `None` marks a finished producer; `False` is a flush tick that writes out
+    a partial batch so slow channels still reach the sink. Once a batch is
+    written, each channel's checkpoint advances to its highest id in the batch.
+    """
+    batch = []
+    total = 0
+    finished = 0
+    while finished < producers:
+        item = await queue.get()
+        if item is None:
+            finished += 1
+        elif item is not False:
+            batch.append(item)
+        if batch and (len(batch) >= batch_size or item is False or finished == producers):
+            # Sinks do blocking file or socket I/O; keep the event loop free for the scrapers
+            await asyncio.to_thread(sink.write_batch, batch)
+            if checkpoints is not None:
+                checkpoints.advance(batch_positions(batch))
+            total += len(batch)
+            batch = []
+    return total
+
+async def scrape_telegram_channels(client, channel_usernames, sink, min_ids=None, checkpoints=None,
+                                   downloads=None, media_channels=(),
+                                   concurrency=DEFAULT_CONCURRENCY, batch_size=DEFAULT_BATCH_SIZE,
+                                   flush_interval=FLUSH_INTERVAL_SECONDS):
+    """Streams all channels into `sink`, scraping at most `concurrency` channels at a time.
+
+    Each channel starts after its id in `min_ids` (0 when missing); with a
+    `checkpoints` store the ids written are recorded for the next run. Photos
+    in `media_channels` are handed to the `downloads` pool during the same pass.
+
+    Rows pass through a bounded queue, so scrapers pause when the sink falls
+    behind and at most `batch_size` plus the queue's worth of rows are held
+    in memory however much history is pulled. Returns the number of rows written.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    queue = asyncio.Queue(maxsize=batch_size * 2)
+
+    async def produce(username):
+        try:
+            async with semaphore:
+                channel_downloads = downloads if username in media_channels else None
+                async for row in iter_channel_messages(client, username, min_id=(min_ids or {}).get(username),
+                                                       downloads=channel_downloads):
+                    await queue.put(row)
+        finally:
+            await queue.put(None)
+
+    async def tick():
+        while True:
+            await asyncio.sleep(flush_interval)
+            await queue.put(False)
+
+    writer = asyncio.create_task(write_batches(queue, sink, batch_size, len(channel_usernames), checkpoints))
+    producers = [asyncio.create_task(produce(username)) for username in channel_usernames]
+    ticker = asyncio.create_task(tick())
     try:
-        with open(filepath, mode='w', newline='', encoding='utf-8') as file:  # Specify encoding='utf-8'
-            writer = csv.DictWriter(file, fieldnames=['message_id', 'sender_id', 'message_text', 'channel', 'date'])
-            writer.writeheader()
-            for message in messages:
-                writer.writerow(message)
-        logger.info(f"Stored {len(messages)} messages to {filepath}")
-    except Exception as e:
-        logger.error(f"Error storing messages to {filepath}: {e}")
+        # A failing sink surfaces here immediately instead of leaving producers blocked on a full queue
+        results = await asyncio.gather(writer, *producers)
+        return results[0]
+    finally:
+        for task in producers + [writer, ticker]:
+            task.cancel()
+
+async def main(client, args):
+    """Scrapes the channels selected by `args`; returns the number of messages stored.
+
+    Raises ValueError when `args` selects no channel, e.g. an empty batch file.
+    """
+    channel_usernames = resolve_channels(args)
+    if not channel_usernames:
+        raise ValueError("No Telegram channel or batch file provided")
 
-async def main():
     logger.info("Starting Telegram client...")
     await client.start(phone)
     logger.info("Telegram client started.")
-    
-    logger.info("Scraping messages...")
-    messages = await scrape_telegram_channels(min_id=args.min_id)
-    
-    logger.info("Storing scraped messages...")
-    store_data(messages)
-    
-    logger.info("Scraping images...")
-    await scrape_images(min_id=args.min_id)
+
+    checkpoints = CheckpointStore(args.checkpoint_db)
+    if args.reset_checkpoints:
+        checkpoints.reset(channel_usernames)
+    min_ids = checkpoints.start_ids(channel_usernames, min_id=args.min_id)
+
+    logger.info(f"Scraping messages from {len(channel_usernames)} channels with concurrency={args.concurrency}...")
+    sink = create_sink(args.sink, output=args.output, db_config=db_config)
+    hashes = PerceptualHashIndex()
+    downloads = MediaDownloadPool(parallelism=args.download_parallelism, hashes=hashes).start()
+    try:
+        # Photos of messages behind the checkpoints whose download failed or never ran
+        await downloads.retry_pending(client)
+        count = await scrape_telegram_channels(client, channel_usernames, sink, min_ids=min_ids,
+                                               checkpoints=checkpoints, downloads=downloads,
+                                               media_channels=image_channels, concurrency=args.concurrency,
+                                               batch_size=args.batch_size)
+    finally:
+        await downloads.close()
+        hashes.close()
+        sink.close()
+        checkpoints.close()
+    logger.info(f"Stored {count} messages to the {args.sink} sink")
 
     logger.info("Scraping process completed.")
+    REGISTRY.log_summary(logger)
+    return count
 
 if __name__ == '__main__':
+    args = parse_args()
+    if not (args.telegram_channel or args.batch_file):
+        logger.error("No Telegram channel or batch file provided")
+        exit(1)
+
+    # Create the Telegram client
+    client = TelegramClient('session_name', api_id, api_hash)
     try:
         with client:
             logger.info("Running the main Telegram scraper function.")
-            client.loop.run_until_complete(main())
+            client.loop.run_until_complete(main(client, args))
     except Exception as e:
         logger.error(f"An error occurred during execution: {e}")